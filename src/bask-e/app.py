@@ -1,18 +1,41 @@
 import requests
 import json
+import logging
+import os
+import threading
 import time
 import sys
+from logzero import setup_logger
 import paho.mqtt.client as mqtt
+from weight_codec import decode_weight_event
+from catalog import ProductCatalog, CatalogRefresher
+from http_transport import PAYMENT_TIMEOUT, transport
+from cart_telemetry import TelemetryDebouncer, RawJSON, encode_payload, project_product
+from cart_fusion import CartFusion
+from topic_dispatch import TopicDispatcher, LOSSLESS, CONFLATE
 
 # ------------------ Configuration ------------------
 THINGSBOARD_BASE_URL = "https://iot-5etoiles.bnf.sigl.epita.fr"
 TOKEN = "eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwaWVycmUubWVpc3NAZXBpdGEuZnIiLCJ1c2VySWQiOiI5MjFjOWU1MC05OTA1LTExZWYtYWY1MC05MTEzNjViMDQyNWYiLCJzY29wZXMiOlsiVEVOQU5UX0FETUlOIl0sInNlc3Npb25JZCI6IjQxMTM4MWFhLTE5NWYtNDZjMC04YWUzLWVkMzI0ODE0MDliOSIsImV4cCI6MTc1NTk2MDA3NSwiaXNzIjoidGhpbmdzYm9hcmQuaW8iLCJpYXQiOjE3MzQ0ODUyMzksImZpcnN0TmFtZSI6IlBpZXJyZSIsImxhc3ROYW1lIjoiTWVpc3MiLCJlbmFibGVkIjp0cnVlLCJpc1B1YmxpYyI6ZmFsc2UsInRlbmFudElkIjoiNjg1MjM5NDAtOTkwNS0xMWVmLWFmNTAtOTExMzY1YjA0MjVmIiwiY3VzdG9tZXJJZCI6IjEzODE0MDAwLTFkZDItMTFiMi04MDgwLTgwODA4MDgwODA4MCJ9.asv2tuEvU8MoUZODqDsu4p05kmNzHgqXA8awxGZoBFGEqDftjuonXCYdtvaY-vUexeeYqxlpTIh6J-KfxNY5Kg"
 MQTT_BROKER = "mqtt.eclipseprojects.io"
 MQTT_PORT = 1883
+# Topic des événements de poids : "scale/weight" (JSON) ou "scale/weight/bin"
+# (binaire, voir weight_codec). Le format est détecté à la réception.
+MQTT_TOPIC_WEIGHT = "scale/weight/bin"
+
+LOG_LEVEL = os.environ.get("BASKE_LOG_LEVEL", "INFO").upper()
 
 REFERENCIEL_UPDATE_RATE = 10 # secondes
-last_timestamp = 0
-last_timestamp1 = 0
+TELEMETRY_DEBOUNCE = 0.5 # secondes de calme avant l'envoi du panier
+TELEMETRY_MAX_DELAY = 2 # secondes au plus entre un changement du panier et son envoi
+FUSION_WEIGHT_TOLERANCE = 60 # écart max (g) entre poids du catalogue et poids mesuré
+FUSION_JOIN_WINDOW = 2 # secondes d'attente d'une pesée cohérente avec la caméra
+# Les services caméra ne publient qu'un comptage stabilisé et modifié :
+# chaque message compte, sans exiger plusieurs images identiques.
+FUSION_STABLE_FRAMES = 1 # messages identiques avant de prendre en compte la caméra
+FUSION_TICK_INTERVAL = 0.25 # secondes entre deux vérifications des fenêtres de fusion
+NFC_QUEUE_SIZE = 64 # paiements en attente avant contre-pression (bornée) sur le client MQTT
+DISPATCH_STATS_INTERVAL = 60 # secondes entre deux relevés des files par topic
 
 # Table de correspondance entre labels YOLO et IDs produits
 YOLO_LABELS_TO_PRODUCT_ID = {
@@ -27,82 +50,81 @@ ATTRIBUTE_URL = f"{THINGSBOARD_BASE_URL}/api/plugins/telemetry/ASSET/495a4310-a8
 TELEMETRY_URL = f"{THINGSBOARD_BASE_URL}/api/v1/muOVFVkq5YWhvpGoSmJq/telemetry"
 PAYMENT_STATUS_URL = f"{THINGSBOARD_BASE_URL}/api/plugins/telemetry/DEVICE/5f680200-a2ca-11ef-8ecc-15f62f1e4cc0/attributes/SHARED_SCOPE"
 
-last_data_scale = {"weight": 0, "difference": 0, "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S')}
-last_data_obj = []
-
 # ------------------ Fonctions Utilitaires ------------------
-def log(message, level="INFO"):
-    """Affiche un message avec un niveau de priorité."""
-    print(f"[{level}] {message}")
+# Journalisation filtrée par niveau (BASKE_LOG_LEVEL, INFO par défaut). Les
+# messages utilisent le formatage différé du module logging : les arguments ne
+# sont mis en forme que si le message est effectivement émis.
+logger = setup_logger(name="app", level=getattr(logging, LOG_LEVEL, logging.INFO))
 
-def send_request(url, method="GET", headers=None, payload=None):
-    """Gère les requêtes HTTP avec gestion des exceptions."""
+# Les dumps JSON des payloads ne sont construits qu'en niveau DEBUG.
+DEBUG_PAYLOADS = logger.isEnabledFor(logging.DEBUG)
+
+def send_request(url, method="GET", headers=None, payload=None, timeout=None):
+    """Gère les requêtes HTTP (session partagée, voir http_transport) avec gestion des exceptions."""
+    options = {} if timeout is None else {"timeout": timeout}
     try:
         if method == "GET":
-            response = requests.get(url, headers=headers)
+            response = transport.get(url, headers=headers, **options)
         elif method == "POST":
-            response = requests.post(url, headers=headers, json=payload)
+            response = transport.post(url, headers=headers, json=payload, **options)
         response.raise_for_status()
         if response.content:
             return response.json()
         else:
-            log("Réponse vide reçue du serveur.", "WARNING")
+            logger.warning("Réponse vide reçue du serveur.")
             return None
         return response.json()
     except requests.exceptions.RequestException as e:
-        log(f"Erreur HTTP : {e}", "ERROR")
+        logger.error("Erreur HTTP : %s", e)
         return None
 
 # ------------------ Classe ShoppingCart ------------------
 class ShoppingCart:
     def __init__(self, token):
         self.token = token
-        self.product_references = []
+        # Protège le contenu du panier, modifié par les workers de plusieurs topics
+        self.lock = threading.Lock()
+        self.catalog = ProductCatalog((), YOLO_LABELS_TO_PRODUCT_ID)
         self.product_list = []
         self.cart_error = False
         self.total_price = 0
+        self.telemetry = TelemetryDebouncer(self.post_telemetry, TELEMETRY_DEBOUNCE, TELEMETRY_MAX_DELAY)
+        headers = {"Authorization": f"Bearer {self.token}"}
+        self.refresher = CatalogRefresher(ATTRIBUTE_URL, headers, self.set_product_references, REFERENCIEL_UPDATE_RATE)
         self.load_product_references()
-        log("Loaded V50")
+        logger.info("Loaded V50")
 
     def load_product_references(self):
-        """Charge les produits de référence depuis Thingsboard."""
-        headers = {"Authorization": f"Bearer {self.token}"}
-        data = send_request(ATTRIBUTE_URL, "GET", headers)
-        if data:
-            self.product_references = [item['value'] for item in data]
-            log(f"Produits chargés : {self.product_references}")
-        else:
-            log("Impossible de charger les produits de référence.", "ERROR")
+        """Charge les produits de référence depuis Thingsboard (appel bloquant)."""
+        if not self.refresher.refresh() and self.refresher.misses == 0:
+            logger.error("Impossible de charger les produits de référence.")
+
+    def set_product_references(self, data):
+        """Construit le catalogue indexé et le substitue en une seule affectation.
+
+        La projection de télémétrie de chaque produit est précalculée ici, une
+        fois par version du catalogue.
+        """
+        self.catalog = ProductCatalog((item['value'] for item in data), YOLO_LABELS_TO_PRODUCT_ID, project_product)
+        logger.info("%d produits chargés, rafraîchissement : %s", len(self.catalog), self.refresher.stats())
 
     def get_product_id_from_yolo_label(self, yolo_label):
         """Récupère l'ID du produit correspondant au label YOLO."""
-        log(f"Association de {yolo_label} avec ref produit id : {YOLO_LABELS_TO_PRODUCT_ID.get(yolo_label.lower())}")
+        logger.debug("Association de %s avec ref produit id : %s", yolo_label, YOLO_LABELS_TO_PRODUCT_ID.get(yolo_label.lower()))
         return YOLO_LABELS_TO_PRODUCT_ID.get(yolo_label.lower())
 
+    @property
+    def product_references(self):
+        """Liste des produits de référence du catalogue courant."""
+        return self.catalog.products
+
     def get_product_by_id(self, object_label):
-        """Récupère un produit par ID."""
-        log(f"HERRRRREEEEEE")
-        log(f"Référentiel {self.product_references}")
-        product_id = self.get_product_id_from_yolo_label(object_label)
-        log(f"Product_id table : {product_id}")
-        if product_id:
-            log("Recherche de produit dans le ref produit") 
-            res = None
-            for p in self.product_references:
-                log(f"Current product {p}")
-                if p['id'] == product_id:
-                    log(f"Product trouvé")
-                    res = p
-                    break
-            print(f"Le résultat est {res}")
-            return res
-        else:
-            log("Pas de produit correspondant au label")
-            return None
+        """Récupère le produit associé à un label YOLO (recherche indexée)."""
+        return self.catalog.get_by_label(object_label)
 
     def update_cart(self):#, object_label, action):
         """Ajoute ou retire un produit dans le panier."""
-        log(f"Mis à jour du panier dans thingsboard, cart : {self.product_list}")
+        logger.debug("Mis à jour du panier dans thingsboard, cart : %s", self.product_list)
         #product = self.get_product_by_id(object_label)
         #if product:
         #    if self.cart_error:
@@ -125,47 +147,67 @@ class ShoppingCart:
         self.total_price = sum(p['price'] for p in self.product_list)
 
     def send_telemetry(self):
-        """Envoie les données du panier à Thingsboard."""
-        log("Envoi des données à thingsboard")
-            
-        # Formatage de la liste des produits avec les bons types
-        formatted_products = []
+        """Soumet l'état du panier à Thingsboard (envoi dédupliqué et différé)."""
+        logger.debug("Envoi des données à thingsboard")
+
+        # La liste des produits est la concaténation des fragments JSON
+        # précalculés par le catalogue ; un produit absent du catalogue
+        # courant (retiré depuis le dernier rafraîchissement) est projeté ici.
+        catalog = self.catalog
+        fragments = []
         for product in self.product_list:
-            formatted_product = {
-                "id": int(product['id']),
-                "name": product['name'],
-                "price": float(product['price']),
-                "weight": int(product['weight']),
-                "nutriScore": product['nutri-score'],
-                "category": product['category'],
-                "image": product['image'],
-                "stock": int(product['stock'])
-            }
-            formatted_products.append(formatted_product)
-            log(f"Produit formaté : {json.dumps(formatted_product, indent=2)}")
-            
+            fragment = catalog.fragment(product['id'])
+            if fragment is None:
+                fragment = json.dumps(project_product(product), separators=(',', ':'))
+            fragments.append(fragment)
+
         payload = {
-            "productList": formatted_products,
+            "productList": RawJSON('[' + ','.join(fragments) + ']'),
             "totalPrice": float(self.total_price),
             "cartError": bool(self.cart_error)
         }
-        log(f"Payload complet : {json.dumps(payload, indent=2)}")
+        if DEBUG_PAYLOADS:
+            logger.debug("Payload complet : %s", encode_payload(payload))
 
-        headers = {"Authorization": f"Bearer {self.token}"}
-        send_request(TELEMETRY_URL, "POST", headers, payload)
-        log("Données du panier envoyées.")
+        # Envoi différé, seulement si le contenu du panier a changé.
+        self.telemetry.submit(payload)
+
+    def post_telemetry(self, payload):
+        """Envoie les clés de télémétrie modifiées ; retourne True si Thingsboard les a acceptées."""
+        headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+        try:
+            transport.post(TELEMETRY_URL, headers=headers, data=encode_payload(payload)).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Erreur HTTP : %s", e)
+            return False
+        logger.info("Données du panier envoyées (%s), télémétrie : %s", ', '.join(payload), self.telemetry.stats())
+        return True
 
     def send_payment_status(self, is_paid):
         """Envoie l'état de paiement."""
         headers = {"Authorization": f"Bearer {self.token}"}
         is_paid = True
         payload = {"isPaid": is_paid}
-        send_request(PAYMENT_STATUS_URL, "POST", headers, payload)
+        send_request(PAYMENT_STATUS_URL, "POST", headers, payload, timeout=PAYMENT_TIMEOUT)
 
 # ------------------ Classe MQTTHandler ------------------
 class MQTTHandler:
     def __init__(self, cart):
         self.cart = cart
+        self.fusion = CartFusion(lambda: self.cart.catalog, FUSION_WEIGHT_TOLERANCE,
+                                 FUSION_JOIN_WINDOW, FUSION_STABLE_FRAMES)
+        # Une file et un worker par topic : le paiement NFC ne perd aucun
+        # message et ne passe jamais derrière les flux caméra/balance, pour
+        # lesquels seul le dernier message compte.
+        self.dispatcher = TopicDispatcher(self.on_handler_error)
+        self.dispatcher.register("nfc/card/read", self.on_nfc_payload, LOSSLESS, NFC_QUEUE_SIZE)
+        self.dispatcher.register(MQTT_TOPIC_WEIGHT, self.on_weight_payload, CONFLATE)
+        self.dispatcher.register("camera/objects/detected", self.on_objects_payload, CONFLATE)
+        self.dispatcher.start()
+        # Fin des fenêtres de fusion constatée même sans nouveau message
+        self._stop = threading.Event()
+        self.fusion_timer = threading.Thread(target=self.run_fusion_timer, name="fusion-timer", daemon=True)
+        self.fusion_timer.start()
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
         self.configure_client()
 
@@ -175,14 +217,14 @@ class MQTTHandler:
             self.client.on_connect = self.on_connect
             self.client.on_message = self.on_message
             self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
-            log(f"Connecté au broker MQTT {MQTT_BROKER}:{MQTT_PORT}")
+            logger.info("Connecté au broker MQTT %s:%s", MQTT_BROKER, MQTT_PORT)
         except Exception as e:
-            log(f"Erreur de connexion MQTT : {e}", "ERROR")
+            logger.error("Erreur de connexion MQTT : %s", e)
             sys.exit(1)
 
         # Abonnements
         self.client.subscribe("nfc/card/read")
-        self.client.subscribe("scale/weight")
+        self.client.subscribe(MQTT_TOPIC_WEIGHT)
         self.client.subscribe("camera/objects/detected")
         self.client.loop_start()
 
@@ -191,113 +233,104 @@ class MQTTHandler:
     @staticmethod
     def on_connect(client, userdata, flags, rc, other):
         """Callback appelé lors de la connexion au broker."""
-        log(f"Connecté au broker MQTT avec le code de résultat : {rc}")
+        logger.info("Connecté au broker MQTT avec le code de résultat : %s", rc)
 
     def on_message(self, client, userdata, message):
-        """Callback appelé lors de la réception d'un message."""
-        topic = message.topic
-        payload = message.payload.decode()
-        log(f"Message reçu sur le topic {topic}: {payload}")
+        """Callback appelé lors de la réception d'un message : dépôt dans la file du topic."""
+        if not self.dispatcher.dispatch(message.topic, message.payload):
+            logger.warning("Message sur un topic non géré : %s", message.topic)
 
-        try:
-            data = json.loads(payload)
-            if topic == "nfc/card/read":
-                self.handle_nfc_message(data)
-            elif topic == "scale/weight":
-                self.handle_weight_change(data)
-            elif topic == "camera/objects/detected":
-                self.handle_objects_detected(data)
-        except json.JSONDecodeError as e:
-            log(f"Erreur de décodage JSON : {e}", "ERROR")
+    @staticmethod
+    def on_handler_error(topic, e):
+        if isinstance(e, json.JSONDecodeError):
+            logger.error("Erreur de décodage JSON : %s", e)
+        else:
+            logger.error("Erreur de traitement du topic %s : %s", topic, e)
+
+    # ------------ Décodage (workers) ------------
+
+    def on_nfc_payload(self, payload):
+        logger.debug("Message reçu sur le topic %s: %s", "nfc/card/read", payload)
+        self.handle_nfc_message(json.loads(payload.decode()))
+
+    def on_weight_payload(self, payload):
+        data = decode_weight_event(payload)
+        logger.debug("Message reçu sur le topic %s: %s", MQTT_TOPIC_WEIGHT, data)
+        self.handle_weight_change(data)
+
+    def on_objects_payload(self, payload):
+        logger.debug("Message reçu sur le topic %s: %s", "camera/objects/detected", payload)
+        self.handle_objects_detected(json.loads(payload.decode()))
 
     # ------------ Gestion des messages ------------
 
     def handle_nfc_message(self, data):
-        if self.cart.total_price > 0:
-            log(f"Paiement de {self.cart.total_price}€ effectué.")
-            self.cart.product_list = []
-            self.cart.send_payment_status(True)  
-            self.cart.total_price = 0         
-            self.cart.update_cart()
-        else:
-            self.cart.send_payment_status(True)
+        with self.cart.lock:
+            if self.cart.total_price > 0:
+                logger.info("Paiement de %s€ effectué.", self.cart.total_price)
+                self.cart.product_list = []
+                self.cart.total_price = 0
+                self.cart.update_cart()
+        self.cart.send_payment_status(True)
         
 
     
     def handle_weight_change(self, data):
-        global last_timestamp, REFERENCIEL_UPDATE_RATE
-        # log("Changement de poids détecté :")
-        # delta = data.get('delta', 0)
-        # for product in self.cart.product_references:
-        #     if abs(abs(delta) - product['weight']) <= 5:
-        #         action = 'add' if delta > 0 else 'remove'
-        # self.cart.update_cart()
-        global last_data_scale
-        last_data_scale = data
-   
-        current_timestamp = int(time.time())
-        if current_timestamp - last_timestamp >= REFERENCIEL_UPDATE_RATE:
-            self.cart.load_product_references()
-            last_timestamp = current_timestamp
-        log(f"Data : {data}")    
+        logger.debug("Data : %s", data)
+        with self.cart.lock:
+            self.apply_mutation(self.fusion.push_weight(data))
 
     def handle_objects_detected(self, objects):
-        global last_data_obj, last_data_scale
-        last_data_obj = objects  
-
-        log(f"Last data scale : {last_data_scale}")
-        
-        total_weight, timestamp, weight_delta = last_data_scale["weight"], last_data_scale["timestamp"], last_data_scale["difference"]  
-        
-        self.cart.product_list = []
-        supposed_total_weight = 0
-        self.cart.cart_error = False
-        for obj in objects:
-            label, count, diff = obj["label"], obj["count"], obj["difference"]
-
-            # Vérifier le cas d'un ajout d'objet :
-            # if float(last_data_scale["difference"]) >= 0.0 and float(diff) >= 0.0:
-                # Chercher le produit correspondant dans le panier
-            product = self.cart.get_product_by_id(label)
-            if product:
-                # Si un produit est trouvé, l'ajouter au panier
-                product["count"] = count
-                supposed_total_weight += product["weight"] 
-
-                self.cart.product_list.append(product)
-                print(f"Added product: {product}")
-            else:
-                # Si le produit n'existe pas dans le catalogue, lever une erreur
-                self.cart.cart_error = True
-                print(f"Error: Product {label} not found in catalog.")
-                break
-
-            # Vérifier le cas d'un retrait d'objet :
-            # elif float(last_data_scale["difference"]) < 0.0 and float(diff) < 0.0:
-            #     product = self.cart.get_product_by_id(label)
-            #     if product and product in self.cart.product_list:
-            #         self.cart.product_list.remove(product)
-            #         print(f"Removed product: {label}")
-            #     else:
-            #         print(f"Error: Product {label} not in cart.")
-
-        log(f"Supposed total weight : {supposed_total_weight}, Total Weight : {total_weight}")
-        acceptance_interval = 60
-        #if total_weight < supposed_total_weight - acceptance_interval or total_weight > supposed_total_weight sacceptance_interval : # Si y'a un problème de poids par rapport au poids qu'on a dans le ref produit
-        #     log("Check du poids error")
-        #     self.cart.cart_error = True
+        """Transmet une image caméra au moteur de fusion balance/caméra."""
+        with self.cart.lock:
+            self.apply_mutation(self.fusion.push_objects(objects))
+
+    def run_fusion_timer(self):
+        """Réévalue périodiquement la fusion : une composition sans pesée cohérente est rejetée à l'échéance."""
+        while not self._stop.wait(FUSION_TICK_INTERVAL):
+            try:
+                with self.cart.lock:
+                    self.apply_mutation(self.fusion.tick())
+            except Exception as e:
+                logger.exception("Erreur de réévaluation de la fusion : %s", e)
+
+    def stop(self):
+        self._stop.set()
+        self.fusion_timer.join()
+
+    def apply_mutation(self, mutation):
+        """Applique au panier une mise à jour réconciliée (appelé sous cart.lock)."""
+        if mutation is None:
+            return
+        logger.debug("Supposed total weight : %s, Total Weight : %s",
+                     mutation.expected_weight, mutation.measured_weight)
+        if mutation.cart_error:
+            logger.warning("Composition caméra incohérente avec la balance, fusion : %s", self.fusion.stats())
+
+        product_list = []
+        for product, count in mutation.items:
+            product["count"] = count
+            product_list.append(product)
+        self.cart.product_list = product_list
+        self.cart.cart_error = mutation.cart_error
         self.cart.update_cart()
-        log(f"cart : {self.cart.product_list}")
+        logger.debug("cart : %s", self.cart.product_list)
 
 # ------------------ Main ------------------
 if __name__ == "__main__":
     try:
         cart = ShoppingCart(TOKEN)
+        # Le référentiel est rafraîchi en tâche de fond, hors callbacks MQTT.
+        cart.refresher.start()
         mqtt_handler = MQTTHandler(cart)
         while True:
-            time.sleep(1)
+            time.sleep(DISPATCH_STATS_INTERVAL)
+            logger.info("Files par topic : %s", mqtt_handler.dispatcher.stats())
     except KeyboardInterrupt:
-        log("Interruption par l'utilisateur. Fermeture...")
+        logger.info("Interruption par l'utilisateur. Fermeture...")
+        cart.telemetry.flush()
         mqtt_handler.client.loop_stop()
         mqtt_handler.client.disconnect()
-        log("Programme terminé proprement.")
+        mqtt_handler.dispatcher.stop()
+        mqtt_handler.stop()
+        logger.info("Programme terminé proprement.")
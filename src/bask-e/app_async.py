@@ -0,0 +1,277 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+import aiohttp
+import aiomqtt
+from weight_codec import decode_weight_event
+from catalog import ProductCatalog, CatalogRefresher
+from http_transport import (CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, BACKOFF_FACTOR,
+                            RETRY_STATUSES, POST_RETRY_STATUSES, PAYMENT_TIMEOUT, POOL_SIZE,
+                            LatencyHistogram)
+from cart_telemetry import AsyncTelemetryDebouncer, RawJSON, encode_payload, project_product
+from cart_fusion import CartFusion
+from app import (logger, DEBUG_PAYLOADS, TOKEN, MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_WEIGHT,
+                 REFERENCIEL_UPDATE_RATE, TELEMETRY_DEBOUNCE, TELEMETRY_MAX_DELAY,
+                 FUSION_WEIGHT_TOLERANCE, FUSION_JOIN_WINDOW, FUSION_STABLE_FRAMES, FUSION_TICK_INTERVAL,
+                 YOLO_LABELS_TO_PRODUCT_ID, ATTRIBUTE_URL, TELEMETRY_URL, PAYMENT_STATUS_URL)
+
+# Service panier en mode asyncio : mêmes topics, même format Thingsboard que
+# app.py, mais les handlers sont des coroutines et les appels HTTP (télémétrie,
+# paiement) s'exécutent en tâches concurrentes. Un Thingsboard lent ne retarde
+# plus le traitement des messages MQTT suivants.
+
+# ------------------ Configuration ------------------
+MQTT_RECONNECT_DELAY = 5 # secondes entre deux tentatives de connexion au broker
+MQTT_TOPICS = ("nfc/card/read", MQTT_TOPIC_WEIGHT, "camera/objects/detected")
+
+# ------------------ Client HTTP asynchrone ------------------
+class AsyncHttpClient:
+    """Client aiohttp partagé : pool de connexions, timeouts et reprises de http_transport."""
+
+    def __init__(self):
+        self.session = None
+        self._histograms = {}
+
+    async def start(self):
+        timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit_per_host=POOL_SIZE)
+        self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def request(self, method, url, **kwargs):
+        """Envoie une requête avec reprises ; retourne le corps de la réponse (bytes).
+
+        Comme avec http_transport.PostSafeRetry, un POST n'est rejoué qu'après
+        un échec de connexion ou sur POST_RETRY_STATUSES, jamais après un
+        délai de lecture expiré (le serveur a pu le traiter).
+        """
+        if method == "POST":
+            statuses, errors = POST_RETRY_STATUSES, aiohttp.ClientConnectorError
+        else:
+            statuses, errors = RETRY_STATUSES, (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+        start = time.monotonic()
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                last = attempt == MAX_RETRIES
+                try:
+                    async with self.session.request(method, url, **kwargs) as response:
+                        body = await response.read()
+                        if response.status not in statuses or last:
+                            response.raise_for_status()
+                            return body
+                except errors:
+                    if last:
+                        raise
+                await asyncio.sleep(BACKOFF_FACTOR * 2 ** attempt)
+        finally:
+            endpoint = f"{method} {urlsplit(url).path}"
+            histogram = self._histograms.get(endpoint)
+            if histogram is None:
+                histogram = self._histograms[endpoint] = LatencyHistogram()
+            histogram.observe((time.monotonic() - start) * 1000)
+
+    def stats(self):
+        """Histogrammes de latence par point d'accès."""
+        return {endpoint: h.snapshot() for endpoint, h in self._histograms.items()}
+
+# ------------------ Classe AsyncShoppingCart ------------------
+class AsyncShoppingCart:
+    """Panier partagé par les handlers ; toute modification se fait sous `lock`."""
+
+    def __init__(self, token, http):
+        self.token = token
+        self.http = http
+        self.lock = asyncio.Lock()
+        self.catalog = ProductCatalog((), YOLO_LABELS_TO_PRODUCT_ID)
+        self.product_list = []
+        self.cart_error = False
+        self.total_price = 0
+        self.telemetry = AsyncTelemetryDebouncer(self.post_telemetry, TELEMETRY_DEBOUNCE, TELEMETRY_MAX_DELAY)
+        headers = {"Authorization": f"Bearer {self.token}"}
+        # Le référentiel reste rafraîchi par son thread dédié : il ne touche
+        # qu'à self.catalog, remplacé en une seule affectation.
+        self.refresher = CatalogRefresher(ATTRIBUTE_URL, headers, self.set_product_references, REFERENCIEL_UPDATE_RATE)
+
+    def load_product_references(self):
+        """Charge les produits de référence depuis Thingsboard (appel bloquant)."""
+        if not self.refresher.refresh() and self.refresher.misses == 0:
+            logger.error("Impossible de charger les produits de référence.")
+
+    def set_product_references(self, data):
+        """Construit le catalogue indexé et le substitue en une seule affectation."""
+        self.catalog = ProductCatalog((item['value'] for item in data), YOLO_LABELS_TO_PRODUCT_ID, project_product)
+        logger.info("%d produits chargés, rafraîchissement : %s", len(self.catalog), self.refresher.stats())
+
+    def update_cart(self):
+        """Recalcule le total et soumet le panier à la télémétrie (appelé sous `lock`)."""
+        self.total_price = sum(p['price'] for p in self.product_list)
+
+        catalog = self.catalog
+        fragments = []
+        for product in self.product_list:
+            fragment = catalog.fragment(product['id'])
+            if fragment is None:
+                fragment = json.dumps(project_product(product), separators=(',', ':'))
+            fragments.append(fragment)
+
+        payload = {
+            "productList": RawJSON('[' + ','.join(fragments) + ']'),
+            "totalPrice": float(self.total_price),
+            "cartError": bool(self.cart_error)
+        }
+        if DEBUG_PAYLOADS:
+            logger.debug("Payload complet : %s", encode_payload(payload))
+        self.telemetry.submit(payload)
+
+    async def post_telemetry(self, payload):
+        """Envoie les clés de télémétrie modifiées ; retourne True si Thingsboard les a acceptées."""
+        headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+        try:
+            await self.http.request("POST", TELEMETRY_URL, headers=headers, data=encode_payload(payload))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Erreur HTTP : %s", e)
+            return False
+        logger.info("Données du panier envoyées (%s), télémétrie : %s", ', '.join(payload), self.telemetry.stats())
+        return True
+
+    async def send_payment_status(self, is_paid):
+        """Envoie l'état de paiement."""
+        headers = {"Authorization": f"Bearer {self.token}"}
+        try:
+            timeout = aiohttp.ClientTimeout(sock_connect=PAYMENT_TIMEOUT[0], sock_read=PAYMENT_TIMEOUT[1])
+            await self.http.request("POST", PAYMENT_STATUS_URL, headers=headers, json={"isPaid": is_paid},
+                                    timeout=timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Erreur HTTP : %s", e)
+
+# ------------------ Classe AsyncMQTTHandler ------------------
+class AsyncMQTTHandler:
+    def __init__(self, cart):
+        self.cart = cart
+        self.fusion = CartFusion(lambda: self.cart.catalog, FUSION_WEIGHT_TOLERANCE,
+                                 FUSION_JOIN_WINDOW, FUSION_STABLE_FRAMES)
+        # Références vers les tâches HTTP en cours (sinon collectables en vol)
+        self._tasks = set()
+
+    async def run(self):
+        """Reçoit les messages MQTT ; se reconnecte au broker en cas de coupure."""
+        timer = asyncio.get_running_loop().create_task(self.run_fusion_timer())
+        try:
+            await self.receive()
+        finally:
+            timer.cancel()
+
+    async def receive(self):
+        while True:
+            try:
+                async with aiomqtt.Client(MQTT_BROKER, MQTT_PORT, keepalive=60) as client:
+                    for topic in MQTT_TOPICS:
+                        await client.subscribe(topic)
+                    logger.info("Connecté au broker MQTT %s:%s", MQTT_BROKER, MQTT_PORT)
+                    async for message in client.messages:
+                        await self.on_message(message)
+            except aiomqtt.MqttError as e:
+                logger.error("Erreur de connexion MQTT : %s", e)
+                await asyncio.sleep(MQTT_RECONNECT_DELAY)
+
+    async def run_fusion_timer(self):
+        """Réévalue périodiquement la fusion : une composition sans pesée cohérente est rejetée à l'échéance."""
+        while True:
+            await asyncio.sleep(FUSION_TICK_INTERVAL)
+            try:
+                async with self.cart.lock:
+                    self.apply_mutation(self.fusion.tick())
+            except Exception as e:
+                logger.exception("Erreur de réévaluation de la fusion : %s", e)
+
+    def spawn(self, coro):
+        """Lance un appel HTTP en tâche de fond, sans bloquer la réception MQTT."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def on_message(self, message):
+        topic = message.topic.value
+
+        try:
+            if topic == MQTT_TOPIC_WEIGHT:
+                data = decode_weight_event(message.payload)
+                logger.debug("Message reçu sur le topic %s: %s", topic, data)
+                await self.handle_weight_change(data)
+                return
+
+            payload = message.payload.decode()
+            logger.debug("Message reçu sur le topic %s: %s", topic, payload)
+            data = json.loads(payload)
+            if topic == "nfc/card/read":
+                await self.handle_nfc_message(data)
+            elif topic == "camera/objects/detected":
+                await self.handle_objects_detected(data)
+        except json.JSONDecodeError as e:
+            logger.error("Erreur de décodage JSON : %s", e)
+        except Exception as e:
+            # Message mal formé ou erreur d'un handler : seul ce message est perdu,
+            # la réception MQTT continue.
+            logger.exception("Erreur de traitement du topic %s : %s", topic, e)
+
+    # ------------ Gestion des messages ------------
+
+    async def handle_nfc_message(self, data):
+        async with self.cart.lock:
+            if self.cart.total_price > 0:
+                logger.info("Paiement de %s€ effectué.", self.cart.total_price)
+                self.cart.product_list = []
+                self.cart.total_price = 0
+                self.cart.update_cart()
+        self.spawn(self.cart.send_payment_status(True))
+
+    async def handle_weight_change(self, data):
+        async with self.cart.lock:
+            self.apply_mutation(self.fusion.push_weight(data))
+
+    async def handle_objects_detected(self, objects):
+        async with self.cart.lock:
+            self.apply_mutation(self.fusion.push_objects(objects))
+
+    def apply_mutation(self, mutation):
+        """Applique au panier une mise à jour réconciliée (appelé sous `lock`)."""
+        if mutation is None:
+            return
+        if mutation.cart_error:
+            logger.warning("Composition caméra incohérente avec la balance, fusion : %s", self.fusion.stats())
+
+        product_list = []
+        for product, count in mutation.items:
+            product["count"] = count
+            product_list.append(product)
+        self.cart.product_list = product_list
+        self.cart.cart_error = mutation.cart_error
+        self.cart.update_cart()
+
+# ------------------ Main ------------------
+async def main():
+    http = AsyncHttpClient()
+    await http.start()
+    cart = AsyncShoppingCart(TOKEN, http)
+    # Premier chargement bloquant hors de la boucle, puis rafraîchissement en tâche de fond.
+    await asyncio.get_running_loop().run_in_executor(None, cart.load_product_references)
+    cart.refresher.start()
+    handler = AsyncMQTTHandler(cart)
+    try:
+        await handler.run()
+    finally:
+        await cart.telemetry.flush()
+        cart.refresher.stop()
+        await http.close()
+        logger.info("Latences HTTP : %s", http.stats())
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Interruption par l'utilisateur. Fermeture...")
+    logger.info("Programme terminé proprement.")
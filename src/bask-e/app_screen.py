@@ -1,7 +1,10 @@
 import requests
 import json
+import logging
+import os
 import time
 import sys
+from logzero import setup_logger
 import paho.mqtt.client as mqtt
 
 # ------------------ Configuration ------------------
@@ -10,6 +13,8 @@ TOKEN = "eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwaWVycmUubWVpc3NAZXBpdGEuZnIiLCJ1c2VySW
 MQTT_BROKER = "mqtt.eclipseprojects.io"
 MQTT_PORT = 1883
 
+LOG_LEVEL = os.environ.get("BASKE_LOG_LEVEL", "INFO").upper()
+
 # Table de correspondance entre labels YOLO et IDs produits
 YOLO_LABELS_TO_PRODUCT_ID = {
     'banana': '1',
@@ -27,9 +32,13 @@ last_data_obj = {}
 
 
 # ------------------ Fonctions Utilitaires ------------------
-def log(message, level="INFO"):
-    """Affiche un message avec un niveau de priorité."""
-    print(f"[{level}] {message}")
+# Journalisation filtrée par niveau (BASKE_LOG_LEVEL, INFO par défaut). Les
+# messages utilisent le formatage différé du module logging : les arguments ne
+# sont mis en forme que si le message est effectivement émis.
+logger = setup_logger(name="app_screen", level=getattr(logging, LOG_LEVEL, logging.INFO))
+
+# Les dumps JSON des payloads ne sont construits qu'en niveau DEBUG.
+DEBUG_PAYLOADS = logger.isEnabledFor(logging.DEBUG)
 
 def send_request(url, method="GET", headers=None, payload=None):
     """Gère les requêtes HTTP avec gestion des exceptions."""
@@ -42,11 +51,11 @@ def send_request(url, method="GET", headers=None, payload=None):
         if response.content:
             return response.json()
         else:
-            log("Réponse vide reçue du serveur.", "WARNING")
+            logger.warning("Réponse vide reçue du serveur.")
             return None
         return response.json()
     except requests.exceptions.RequestException as e:
-        log(f"Erreur HTTP : {e}", "ERROR")
+        logger.error("Erreur HTTP : %s", e)
         return None
 
 # ------------------ Classe ShoppingCart ------------------
@@ -65,37 +74,36 @@ class ShoppingCart:
         data = send_request(ATTRIBUTE_URL, "GET", headers)
         if data:
             self.product_references = [item['value'] for item in data]
-            log(f"Produits chargés : {self.product_references}")
+            logger.info("%d produits chargés", len(self.product_references))
+            logger.debug("Produits chargés : %s", self.product_references)
         else:
-            log("Impossible de charger les produits de référence.", "ERROR")
+            logger.error("Impossible de charger les produits de référence.")
 
     def get_product_id_from_yolo_label(self, yolo_label):
         """Récupère l'ID du produit correspondant au label YOLO."""
-        log(f"Association de {yolo_label} avec ref produit id : {YOLO_LABELS_TO_PRODUCT_ID.get(yolo_label.lower())}")
+        logger.debug("Association de %s avec ref produit id : %s", yolo_label, YOLO_LABELS_TO_PRODUCT_ID.get(yolo_label.lower()))
         return YOLO_LABELS_TO_PRODUCT_ID.get(yolo_label.lower())
 
     def get_product_by_id(self, object_label):
         """Récupère un produit par ID."""
-        log(f"HERRRRREEEEEE")
-        log(f"Référentiel {self.product_references}")
         product_id = self.get_product_id_from_yolo_label(object_label)
         if product_id:
-            log("Recherche de produit dans le ref produit") 
+            logger.debug("Recherche de produit dans le ref produit") 
             res = None
             for p in self.product_references:
                 if p['id'] == product_id:
-                    log(f"Product trouvé")
+                    logger.debug("Product trouvé")
                     res = p
                     break
-            print(f"Le résultat est {res}")
+            logger.debug("Le résultat est %s", res)
             return res
         else:
-            log("Pas de produit correspondant au label")
+            logger.debug("Pas de produit correspondant au label")
             return None
 
     def update_cart(self):#, object_label, action):
         """Ajoute ou retire un produit dans le panier."""
-        log("Mis à jour du panier dans thingsboard")
+        logger.debug("Mis à jour du panier dans thingsboard")
         #product = self.get_product_by_id(object_label)
         #if product:
         #    if self.cart_error:
@@ -119,7 +127,7 @@ class ShoppingCart:
 
     def send_telemetry(self):
         """Envoie les données du panier à Thingsboard."""
-        log("Envoi des données à thingsboard")
+        logger.debug("Envoi des données à thingsboard")
         if len(self.product_list) == 0:
             return
             
@@ -137,18 +145,20 @@ class ShoppingCart:
                 "stock": int(product['stock'])
             }
             formatted_products.append(formatted_product)
-            log(f"Produit formaté : {json.dumps(formatted_product, indent=2)}")
+            if DEBUG_PAYLOADS:
+                logger.debug("Produit formaté : %s", json.dumps(formatted_product, indent=2))
             
         payload = {
             "productList": formatted_products,
             "totalPrice": float(self.total_price),
             "cartError": bool(self.cart_error)
         }
-        log(f"Payload complet : {json.dumps(payload, indent=2)}")
+        if DEBUG_PAYLOADS:
+            logger.debug("Payload complet : %s", json.dumps(payload, indent=2))
 
         headers = {"Authorization": f"Bearer {self.token}"}
         send_request(TELEMETRY_URL, "POST", headers, payload)
-        log("Données du panier envoyées.")
+        logger.info("Données du panier envoyées.")
 
     def send_payment_status(self, is_paid):
         """Envoie l'état de paiement."""
@@ -156,7 +166,7 @@ class ShoppingCart:
         is_paid = True
         payload = {"isPaid": is_paid}
         send_request(PAYMENT_STATUS_URL, "POST", headers, payload)
-        log(f"Statut de paiement : {'Payé' if is_paid else 'Non payé'}")
+        logger.info("Statut de paiement : %s", 'Payé' if is_paid else 'Non payé')
 
 # ------------------ Classe MQTTHandler ------------------
 class MQTTHandler:
@@ -171,9 +181,9 @@ class MQTTHandler:
             self.client.on_connect = self.on_connect
             self.client.on_message = self.on_message
             self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
-            log(f"Connecté au broker MQTT {MQTT_BROKER}:{MQTT_PORT}")
+            logger.info("Connecté au broker MQTT %s:%s", MQTT_BROKER, MQTT_PORT)
         except Exception as e:
-            log(f"Erreur de connexion MQTT : {e}", "ERROR")
+            logger.error("Erreur de connexion MQTT : %s", e)
             sys.exit(1)
 
         # Abonnements
@@ -187,13 +197,13 @@ class MQTTHandler:
     @staticmethod
     def on_connect(client, userdata, flags, rc, other):
         """Callback appelé lors de la connexion au broker."""
-        log(f"Connecté au broker MQTT avec le code de résultat : {rc}")
+        logger.info("Connecté au broker MQTT avec le code de résultat : %s", rc)
 
     def on_message(self, client, userdata, message):
         """Callback appelé lors de la réception d'un message."""
         topic = message.topic
         payload = message.payload.decode()
-        log(f"Message reçu sur le topic {topic}: {payload}")
+        logger.debug("Message reçu sur le topic %s: %s", topic, payload)
 
         try:
             data = json.loads(payload)
@@ -204,13 +214,13 @@ class MQTTHandler:
             elif topic == "camera/objects/detected":
                 self.handle_objects_detected(data)
         except json.JSONDecodeError as e:
-            log(f"Erreur de décodage JSON : {e}", "ERROR")
+            logger.error("Erreur de décodage JSON : %s", e)
 
     # ------------ Gestion des messages ------------
 
     def handle_nfc_message(self, data):
         if data.get('payment_mode') and self.cart.total_price > 0:
-            log(f"Paiement de {self.cart.total_price}€ effectué.")
+            logger.info("Paiement de %s€ effectué.", self.cart.total_price)
             self.cart.product_list = []
             self.cart.total_price = 0
             #self.cart.send_telemetry()
@@ -241,11 +251,11 @@ class MQTTHandler:
                     if self.cart.cart_error:
                         self.cart.cart_error = False  # Réinitialiser les erreurs de panier
                     self.cart.product_list.append(product)
-                    print(f"Added product: {label}")
+                    logger.debug("Added product: %s", label)
                 else:
                     # Si le produit n'existe pas dans le catalogue, lever une erreur
                     self.cart.cart_error = True
-                    print(f"Error: Product {label} not found in catalog.")
+                    logger.warning("Error: Product %s not found in catalog.", label)
                     break
 
             # Vérifier le cas d'un retrait d'objet :
@@ -253,12 +263,13 @@ class MQTTHandler:
                 product = self.cart.get_product_by_id(label)
                 if product and product in self.cart.product_list:
                     self.cart.product_list.remove(product)
-                    print(f"Removed product: {label}")
+                    logger.debug("Removed product: %s", label)
                 else:
-                    print(f"Error: Product {label} not in cart.")
+                    logger.warning("Error: Product %s not in cart.", label)
 
         # Afficher le contenu du panier pour vérifier les mises à jour
-        print("Current cart contents:", [p.name for p in self.cart.product_list])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Current cart contents: %s", [p['name'] for p in self.cart.product_list])
         
 
 # ------------------ Main ------------------
@@ -269,7 +280,7 @@ if __name__ == "__main__":
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        log("Interruption par l'utilisateur. Fermeture...")
+        logger.info("Interruption par l'utilisateur. Fermeture...")
         mqtt_handler.client.loop_stop()
         mqtt_handler.client.disconnect()
-        log("Programme terminé proprement.")
+        logger.info("Programme terminé proprement.")
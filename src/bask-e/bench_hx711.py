@@ -0,0 +1,68 @@
+import argparse
+import time
+import gpiod
+from hx711 import HX711
+
+# --------------------- Configuration ---------------------
+
+DOUT_PIN = 11
+SCK_PIN = 7
+SAMPLES = 200
+
+# --------------------- Benchmark ---------------------
+
+def legacy_read(hx):
+    """Ancienne acquisition : trois octets lus bit par bit."""
+    hx.readRawBytes()
+
+def frame_read(hx):
+    """Nouvelle acquisition : trame complète en une seule boucle."""
+    hx.readRawFrame()
+
+def run(hx, read, samples):
+    """Mesure le temps et le CPU de cadencement d'une trame (µs), et la charge CPU totale.
+
+    L'attente d'une conversion (wait_ready) se fait hors des mesures par
+    trame : elle dépend de la cadence du HX711 (10 ou 80 échantillons/s)
+    et non du chemin de lecture. Elle reste comptée dans la charge totale,
+    ce qui compare l'attente active et l'attente sur front (--edge).
+    """
+    # Une lecture de chauffe pour partir d'une conversion fraîche.
+    read(hx)
+
+    wall = cpu = 0.0
+    run_wall = time.perf_counter()
+    run_cpu = time.process_time()
+    for _ in range(samples):
+        hx.wait_ready()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        read(hx)
+        cpu += time.process_time() - cpu_start
+        wall += time.perf_counter() - wall_start
+    run_cpu = time.process_time() - run_cpu
+    run_wall = time.perf_counter() - run_wall
+
+    return 1e6 * wall / samples, 1e6 * cpu / samples, 100.0 * run_cpu / run_wall
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des chemins d'acquisition HX711.")
+    parser.add_argument("--dout", type=int, default=DOUT_PIN)
+    parser.add_argument("--sck", type=int, default=SCK_PIN)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--edge", action="store_true",
+                        help="attend DOUT sur événement de front au lieu de boucler")
+    args = parser.parse_args()
+
+    chip = gpiod.chip("/dev/gpiochip0", gpiod.chip.OPEN_BY_PATH)
+    hx = HX711(dout=args.dout, pd_sck=args.sck, chip=chip, edge_wait=args.edge)
+    hx.set_reading_format("MSB", "MSB")
+    hx.reset()
+
+    print(f"{'chemin':<10} {'µs/trame':>10} {'CPU µs/trame':>13} {'CPU % total':>12}")
+    for name, read in (("legacy", legacy_read), ("frame", frame_read)):
+        frame_us, cpu_us, cpu = run(hx, read, args.samples)
+        print(f"{name:<10} {frame_us:>10.1f} {cpu_us:>13.1f} {cpu:>12.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import timeit
+from weight_codec import encode_weight_event, encode_weight_event_json, decode_weight_event
+
+# --------------------- Configuration ---------------------
+
+ITERATIONS = 100000
+WEIGHT = 1234.5
+DIFFERENCE = -312.25
+
+# --------------------- Benchmark ---------------------
+
+def main():
+    json_payload = encode_weight_event_json(WEIGHT, DIFFERENCE).encode()
+    binary_payload = encode_weight_event(WEIGHT, DIFFERENCE)
+
+    cases = (
+        ("json", lambda: encode_weight_event_json(WEIGHT, DIFFERENCE), lambda: decode_weight_event(json_payload), json_payload),
+        ("binaire", lambda: encode_weight_event(WEIGHT, DIFFERENCE), lambda: decode_weight_event(binary_payload), binary_payload),
+    )
+
+    print(f"{'format':<10} {'encodage (µs)':>14} {'décodage (µs)':>14} {'octets':>8}")
+    for name, encode, decode, payload in cases:
+        encode_us = timeit.timeit(encode, number=ITERATIONS) / ITERATIONS * 1e6
+        decode_us = timeit.timeit(decode, number=ITERATIONS) / ITERATIONS * 1e6
+        print(f"{name:<10} {encode_us:>14.2f} {decode_us:>14.2f} {len(payload):>8}")
+
+if __name__ == '__main__':
+    main()
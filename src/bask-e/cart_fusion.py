@@ -0,0 +1,192 @@
+import time
+from collections import deque
+
+# --------------------- Configuration par défaut ---------------------
+
+WEIGHT_TOLERANCE = 60  # Écart max (g) entre poids attendu et poids mesuré
+JOIN_WINDOW = 2.0  # Fenêtre (s) pendant laquelle une composition attend un poids cohérent
+STABLE_FRAMES = 3  # Images consécutives identiques avant de considérer une composition
+HISTORY = 10.0  # Durée (s) conservée dans les tampons d'événements
+
+
+class CartMutation:
+    """Mise à jour réconciliée du panier émise par le moteur de fusion."""
+
+    __slots__ = ('items', 'cart_error', 'expected_weight', 'measured_weight')
+
+    def __init__(self, items, cart_error, expected_weight, measured_weight):
+        # Liste de (produit du catalogue, quantité)
+        self.items = items
+        self.cart_error = cart_error
+        self.expected_weight = expected_weight
+        self.measured_weight = measured_weight
+
+
+class CartFusion:
+    """Rapproche les flux balance et caméra sur des fenêtres temporelles.
+
+    Chaque événement est horodaté en temps monotone local. Les événements
+    binaires de la balance portent l'horodatage monotone de la balance, qui
+    tourne sur une autre machine : le décalage entre les deux horloges est
+    estimé par le minimum de (arrivée - horodatage), ce qui ramène chaque
+    pesée à son instant de mesure plutôt qu'à son instant de réception.
+
+    Une composition caméra (quantité par label) n'est considérée qu'après
+    `stable_frames` images identiques. Elle est acceptée si la somme des
+    poids catalogue correspond, à `tolerance` près, au dernier poids mesuré
+    au plus tard `join_window` secondes après sa stabilisation ; passé ce
+    délai sans poids cohérent, elle est rejetée et le panier est signalé en
+    erreur. Une composition rejetée reste candidate : elle est acceptée dès
+    qu'une pesée ultérieure correspond (balance lente à se stabiliser).
+    Tant qu'aucune pesée n'a été reçue, la caméra fait foi. Une mutation
+    n'est émise que si le panier ou son état d'erreur change.
+
+    Balance et caméra ne publient que leurs changements : tick() doit être
+    appelé périodiquement pour que la fin d'une fenêtre soit constatée même
+    si aucun autre événement n'arrive.
+    """
+
+    def __init__(self, catalog, tolerance=WEIGHT_TOLERANCE, join_window=JOIN_WINDOW,
+                 stable_frames=STABLE_FRAMES, history=HISTORY):
+        # `catalog` : fonction retournant le ProductCatalog courant
+        self.catalog = catalog
+        self.tolerance = tolerance
+        self.join_window_ns = int(join_window * 1e9)
+        self.stable_frames = stable_frames
+        self.history_ns = int(history * 1e9)
+
+        self._weights = deque()  # (t_ns, poids total)
+        self._frames = deque()  # (t_ns, composition)
+        self._scale_offset = None
+
+        self._candidate = None
+        self._candidate_since = None
+        self._streak = 0
+        self._rejected = False  # La composition candidate a déjà été rejetée
+        self._committed = (None, False)
+
+        # Compteurs
+        self.accepted = 0
+        self.rejected = 0
+
+    def push_weight(self, data, arrival_ns=None):
+        """Ajoute un événement de poids décodé ; retourne une CartMutation ou None."""
+        if arrival_ns is None:
+            arrival_ns = time.monotonic_ns()
+        t = arrival_ns
+        stamp = data.get('timestamp_ns')
+        if stamp is not None:
+            offset = arrival_ns - stamp
+            if self._scale_offset is None or offset < self._scale_offset:
+                self._scale_offset = offset
+            t = stamp + self._scale_offset
+
+        self._weights.append((t, float(data['weight'])))
+        self._prune(arrival_ns)
+        return self._reconcile(arrival_ns)
+
+    def push_objects(self, objects, arrival_ns=None):
+        """Ajoute une image caméra (liste label/count) ; retourne une CartMutation ou None."""
+        if arrival_ns is None:
+            arrival_ns = time.monotonic_ns()
+        composition = tuple(sorted((obj['label'], int(obj['count'])) for obj in objects if int(obj['count']) > 0))
+        self._frames.append((arrival_ns, composition))
+
+        if composition == self._candidate:
+            self._streak += 1
+        else:
+            self._candidate = composition
+            self._streak = 1
+            self._rejected = False
+        if self._streak == self.stable_frames:
+            self._candidate_since = arrival_ns
+
+        self._prune(arrival_ns)
+        return self._reconcile(arrival_ns)
+
+    def tick(self, now_ns=None):
+        """Réévalue la composition en attente à l'instant `now_ns` ; retourne une CartMutation ou None."""
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        self._prune(now_ns)
+        return self._reconcile(now_ns)
+
+    def _prune(self, now):
+        horizon = now - self.history_ns
+        # Le dernier poids est toujours gardé : c'est l'état courant de la balance.
+        while len(self._weights) > 1 and self._weights[0][0] < horizon:
+            self._weights.popleft()
+        while self._frames and self._frames[0][0] < horizon:
+            self._frames.popleft()
+
+    def _weight_before(self, t):
+        """Dernier poids mesuré à l'instant t ou avant, ou None."""
+        for stamp, weight in reversed(self._weights):
+            if stamp <= t:
+                return weight
+        return None
+
+    def _reconcile(self, now):
+        if self._streak < self.stable_frames or self._committed == (self._candidate, False):
+            return None
+
+        catalog = self.catalog()
+        items = []
+        expected = 0.0
+        for label, count in self._candidate:
+            product = catalog.get_by_label(label)
+            if product is None:
+                # Label absent du catalogue : la composition ne peut pas être vérifiée.
+                return self._reject(expected, None)
+            items.append((product, count))
+            expected += float(product['weight']) * count
+
+        if self._rejected:
+            # Fenêtre dépassée : seule une pesée plus récente peut encore l'accepter.
+            measured = self._weight_before(now)
+            if measured is not None and abs(measured - expected) <= self.tolerance:
+                self.accepted += 1
+                return self._emit(self._candidate, False, items, expected, measured)
+            return None
+
+        deadline = self._candidate_since + self.join_window_ns
+        measured = self._weight_before(min(now, deadline))
+        if not self._weights:
+            # Aucune pesée reçue depuis le démarrage (la balance ne publie
+            # que les changements) : la composition caméra fait foi.
+            self.accepted += 1
+            return self._emit(self._candidate, False, items, expected, None)
+        if measured is not None and abs(measured - expected) <= self.tolerance:
+            self.accepted += 1
+            return self._emit(self._candidate, False, items, expected, measured)
+        if now >= deadline:
+            return self._reject(expected, measured)
+        return None
+
+    def _reject(self, expected, measured):
+        if self._rejected:
+            return None
+        self.rejected += 1
+        self._rejected = True
+        # Le contenu accepté précédemment est conservé, seule l'erreur est signalée.
+        if self._committed[1]:
+            return None
+        committed = self._committed[0]
+        items = []
+        if committed:
+            catalog = self.catalog()
+            items = [(catalog.get_by_label(label), count) for label, count in committed]
+            items = [(product, count) for product, count in items if product is not None]
+        return self._emit(committed, True, items, expected, measured)
+
+    def _emit(self, composition, cart_error, items, expected, measured):
+        self._committed = (composition, cart_error)
+        return CartMutation(items, cart_error, expected, measured)
+
+    def stats(self):
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'weights': len(self._weights),
+            'frames': len(self._frames)
+        }
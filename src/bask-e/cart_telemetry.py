@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+DEBOUNCE_WINDOW = 0.5  # secondes de calme avant envoi
+MAX_DELAY = 2.0  # délai maximal (s) entre le premier changement et son envoi
+
+
+class RawJSON(str):
+    """Valeur de télémétrie déjà sérialisée en JSON, insérée telle quelle."""
+
+
+def digest(value):
+    """Empreinte stable d'une valeur JSON (ordre des clés normalisé)."""
+    if isinstance(value, RawJSON):
+        return hashlib.sha1(value.encode()).digest()
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).digest()
+
+
+def encode_payload(payload):
+    """Sérialise un payload de télémétrie ; les valeurs RawJSON ne sont pas réencodées."""
+    return '{' + ','.join(
+        json.dumps(key) + ':' + (value if isinstance(value, RawJSON) else json.dumps(value, separators=(',', ':')))
+        for key, value in payload.items()
+    ) + '}'
+
+
+def project_product(product):
+    """Projection d'un produit du référentiel au format de télémétrie du panier."""
+    return {
+        "id": int(product['id']),
+        "name": product['name'],
+        "price": float(product['price']),
+        "weight": int(product['weight']),
+        "nutriScore": product['nutri-score'],
+        "category": product['category'],
+        "image": product['image'],
+        "stock": int(product['stock'])
+    }
+
+
+class TelemetryDebouncer:
+    """Envoi différé et dédupliqué de l'état du panier vers Thingsboard.
+
+    submit() reçoit l'état complet du panier à chaque mise à jour. Un état
+    identique au dernier envoyé est ignoré. Sinon l'envoi part en fin de
+    rafale : `window` secondes après le dernier changement, et au plus tard
+    `max_delay` secondes après le premier, avec seulement le dernier état.
+    Thingsboard conserve la dernière valeur de chaque clé de télémétrie :
+    seules les clés dont l'empreinte a changé sont envoyées.
+
+    `send(payload)` est appelé depuis un thread Timer et retourne True si
+    Thingsboard a accepté les données ; en cas d'échec l'état reste en
+    attente et un nouvel essai part `max_delay` secondes plus tard.
+    """
+
+    def __init__(self, send, window=DEBOUNCE_WINDOW, max_delay=MAX_DELAY):
+        self.send = send
+        self.window = window
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = None
+        self._first_pending = None
+        self._sent_digests = {}
+
+        # Compteurs
+        self.sent = 0
+        self.suppressed = 0
+
+    def submit(self, payload):
+        """Propose un nouvel état du panier."""
+        digests = {key: digest(value) for key, value in payload.items()}
+        with self._lock:
+            known = all(self._sent_digests.get(key) == d for key, d in digests.items())
+            if self._pending is not None or known:
+                # Un changement jamais envoyé : remplacé avant l'envoi, ou
+                # annulé par le retour à l'état déjà connu de Thingsboard.
+                self.suppressed += 1
+            if known:
+                self._cancel()
+                return
+
+            now = time.monotonic()
+            if self._pending is None:
+                self._first_pending = now
+            self._pending = (payload, digests)
+            self._schedule(min(self.window, self._first_pending + self.max_delay - now))
+
+    def _schedule(self, delay):
+        # Appelé avec self._lock acquis.
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(0.0, delay), self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Envoie immédiatement l'état en attente, s'il y en a un."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self._flush()
+
+    def _cancel(self):
+        # Appelé avec self._lock acquis.
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = None
+
+    def _flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = None
+            self._timer = None
+            if pending is None:
+                return
+            payload, digests = pending
+            changed = [key for key, d in digests.items() if self._sent_digests.get(key) != d]
+            # Marqué envoyé dès maintenant : un submit() concurrent du même
+            # état n'est pas renvoyé pendant l'appel HTTP.
+            previous = {key: self._sent_digests.get(key) for key in changed}
+            self._sent_digests.update((key, digests[key]) for key in changed)
+
+        if not changed:
+            return
+        if self.send({key: payload[key] for key in changed}):
+            with self._lock:
+                self.sent += 1
+            return
+
+        with self._lock:
+            for key, d in previous.items():
+                if self._sent_digests.get(key) == digests[key]:
+                    self._sent_digests[key] = d
+            # Échec : l'état reste en attente, sauf si un état plus récent l'a remplacé.
+            if self._pending is None:
+                self._pending = pending
+                self._first_pending = time.monotonic()
+                self._schedule(self.max_delay)
+
+    def stats(self):
+        with self._lock:
+            return {'sent': self.sent, 'suppressed': self.suppressed, 'pending': self._pending is not None}
+
+
+class AsyncTelemetryDebouncer:
+    """Équivalent asyncio de TelemetryDebouncer.
+
+    Même politique d'envoi (fin de rafale, délai maximal, clés modifiées
+    seulement, nouvel essai après un échec), sans thread : l'attente est une
+    tâche de la boucle asyncio et `send(payload)` est une coroutine qui
+    retourne True si Thingsboard a accepté les données. submit() doit être
+    appelé depuis la boucle.
+    """
+
+    def __init__(self, send, window=DEBOUNCE_WINDOW, max_delay=MAX_DELAY):
+        self.send = send
+        self.window = window
+        self.max_delay = max_delay
+        self._task = None
+        self._due = None
+        self._pending = None
+        self._first_pending = None
+        self._sent_digests = {}
+
+        # Compteurs
+        self.sent = 0
+        self.suppressed = 0
+
+    def submit(self, payload):
+        """Propose un nouvel état du panier."""
+        digests = {key: digest(value) for key, value in payload.items()}
+        known = all(self._sent_digests.get(key) == d for key, d in digests.items())
+        if self._pending is not None or known:
+            # Un changement jamais envoyé : remplacé avant l'envoi, ou annulé
+            # par le retour à l'état déjà connu de Thingsboard.
+            self.suppressed += 1
+        if known:
+            self._pending = None
+            return
+
+        now = asyncio.get_running_loop().time()
+        if self._pending is None:
+            self._first_pending = now
+        self._pending = (payload, digests)
+        self._schedule(min(now + self.window, self._first_pending + self.max_delay))
+
+    def _schedule(self, due):
+        self._due = due
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._wait_and_flush())
+
+    async def _wait_and_flush(self):
+        loop = asyncio.get_running_loop()
+        # L'échéance peut reculer pendant l'attente, et un nouvel état peut
+        # arriver pendant l'envoi : on boucle tant qu'il reste un état en attente.
+        while self._pending is not None:
+            delay = self._due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                await self.flush()
+
+    async def flush(self):
+        """Envoie immédiatement l'état en attente, s'il y en a un."""
+        pending = self._pending
+        self._pending = None
+        if pending is None:
+            return
+        payload, digests = pending
+        changed = [key for key, d in digests.items() if self._sent_digests.get(key) != d]
+        if not changed:
+            return
+        # Marqué envoyé avant l'appel HTTP, comme dans TelemetryDebouncer.
+        previous = {key: self._sent_digests.get(key) for key in changed}
+        self._sent_digests.update((key, digests[key]) for key in changed)
+
+        if await self.send({key: payload[key] for key in changed}):
+            self.sent += 1
+            return
+        for key, d in previous.items():
+            if self._sent_digests.get(key) == digests[key]:
+                self._sent_digests[key] = d
+        # Échec : l'état reste en attente, sauf si un état plus récent l'a remplacé.
+        if self._pending is None:
+            self._pending = pending
+            self._first_pending = asyncio.get_running_loop().time()
+            self._schedule(self._first_pending + self.max_delay)
+
+    def stats(self):
+        return {'sent': self.sent, 'suppressed': self.suppressed, 'pending': self._pending is not None}
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import requests
+from logzero import setup_logger
+from http_transport import transport
+
+# Même filtrage par niveau que les services panier (BASKE_LOG_LEVEL, INFO par défaut)
+logger = setup_logger(name="catalog",
+                      level=getattr(logging, os.environ.get("BASKE_LOG_LEVEL", "INFO").upper(), logging.INFO))
+
+REFRESH_INTERVAL = 10  # secondes
+REQUEST_TIMEOUT = 5  # secondes
+
+
+class ProductCatalog:
+    """Référentiel produits indexé par ID produit et par label YOLO.
+
+    Les index sont construits une fois au chargement ; un catalogue n'est
+    plus modifié ensuite. Pour le rafraîchir, on en construit un nouveau et
+    on remplace la référence en une seule affectation : un lecteur voit
+    toujours soit l'ancien catalogue complet, soit le nouveau.
+
+    Si `projection` est fourni, la projection de chaque produit (par exemple
+    son format de télémétrie) est calculée une seule fois par version du
+    catalogue, ainsi que sa sérialisation JSON compacte (`fragments`).
+    """
+
+    def __init__(self, products=(), label_to_id=None, projection=None):
+        self.products = tuple(products)
+        self.by_id = {p['id']: p for p in self.products}
+        self.projected = {}
+        self.fragments = {}
+        if projection is not None:
+            for product_id, product in self.by_id.items():
+                projected = self.projected[product_id] = projection(product)
+                self.fragments[product_id] = json.dumps(projected, separators=(',', ':'))
+        self.by_label = {}
+        for label, product_id in (label_to_id or {}).items():
+            product = self.by_id.get(product_id)
+            if product is not None:
+                self.by_label[label.lower()] = product
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id):
+        """Retourne le produit d'ID `product_id`, ou None."""
+        return self.by_id.get(product_id)
+
+    def get_by_label(self, yolo_label):
+        """Retourne le produit associé au label YOLO, ou None."""
+        return self.by_label.get(yolo_label.lower())
+
+    def fragment(self, product_id):
+        """Retourne la projection JSON précalculée du produit, ou None."""
+        return self.fragments.get(product_id)
+
+
+class CatalogRefresher:
+    """Rafraîchit le référentiel produits en tâche de fond.
+
+    Chaque passe envoie une requête conditionnelle (If-None-Match /
+    If-Modified-Since quand le serveur fournit ETag / Last-Modified). Une
+    réponse 304, ou un contenu dont l'empreinte SHA-256 n'a pas changé, est
+    comptée comme « hit » et n'est pas décodée. Sinon `on_update` reçoit le
+    JSON décodé et construit le nouveau catalogue. Le traitement des messages
+    MQTT n'attend donc jamais Thingsboard.
+    """
+
+    def __init__(self, url, headers, on_update, interval=REFRESH_INTERVAL, timeout=REQUEST_TIMEOUT):
+        self.url = url
+        self.headers = headers
+        self.on_update = on_update
+        self.interval = interval
+        self.timeout = timeout
+        self._etag = None
+        self._last_modified = None
+        self._digest = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Compteurs
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.last_latency = None  # secondes
+        self.total_latency = 0.0
+
+    def start(self):
+        """Lance le rafraîchissement périodique dans un thread dédié."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def refresh(self):
+        """Effectue une passe de rafraîchissement ; retourne True si le catalogue a changé."""
+        headers = dict(self.headers)
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        start = time.monotonic()
+        try:
+            response = transport.get(self.url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self._record(start, hit=True)
+                return False
+            response.raise_for_status()
+
+            digest = hashlib.sha256(response.content).digest()
+            if digest == self._digest:
+                self._record(start, hit=True)
+                return False
+
+            data = response.json()
+            if not data:
+                raise ValueError("référentiel vide")
+            self.on_update(data)
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            self.errors += 1
+            logger.error("Rafraîchissement du référentiel impossible : %s", e)
+            return False
+
+        self._etag = response.headers.get("ETag")
+        self._last_modified = response.headers.get("Last-Modified")
+        self._digest = digest
+        self._record(start, hit=False)
+        return True
+
+    def _record(self, start, hit):
+        self.last_latency = time.monotonic() - start
+        self.total_latency += self.last_latency
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        """Compteurs hit/miss/erreur et latences de rafraîchissement (ms)."""
+        passes = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'last_latency_ms': None if self.last_latency is None else self.last_latency * 1000,
+            'avg_latency_ms': self.total_latency / passes * 1000 if passes else None
+        }
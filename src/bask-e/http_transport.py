@@ -0,0 +1,123 @@
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ------------------ Configuration ------------------
+CONNECT_TIMEOUT = 3.05  # secondes
+READ_TIMEOUT = 10  # secondes
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5  # attente 0.5 s, 1 s, 2 s... entre deux tentatives
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Un POST n'est pas idempotent : il n'est rejoué que sur erreur de connexion
+# (requête non envoyée) ou sur ces statuts (requête refusée sans traitement).
+POST_RETRY_STATUSES = (429, 503)
+# Paiement : l'utilisateur attend la réponse, lecture plus courte. Pire cas
+# ~21 s (4 connexions de 3.05 s, attentes 0.5 + 1 + 2 s, une lecture de 5 s)
+# au lieu de ~50 s avec le timeout par défaut et des lectures rejouées.
+PAYMENT_TIMEOUT = (CONNECT_TIMEOUT, 5)
+POOL_SIZE = 4  # connexions gardées ouvertes par hôte
+
+# Bornes supérieures (ms) des classes des histogrammes de latence
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Histogramme de latences à classes fixes."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # dernière classe : au-delà de la dernière borne
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, latency_ms):
+        self.counts[bisect_left(self.bounds, latency_ms)] += 1
+        self.count += 1
+        self.total += latency_ms
+
+    def snapshot(self):
+        labels = [f"<={b}ms" for b in self.bounds] + [f">{self.bounds[-1]}ms"]
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count if self.count else None,
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class PostSafeRetry(Retry):
+    """Reprises urllib3 qui ne rejouent pas un POST déjà traité.
+
+    POST est absent de allowed_methods : urllib3 ne le rejoue donc ni après
+    une erreur de lecture, ni sur les statuts de RETRY_STATUSES. Seuls les
+    statuts POST_RETRY_STATUSES sont rajoutés ici.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method == "POST":
+            return bool(self.total) and status_code in POST_RETRY_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class HttpTransport:
+    """Couche HTTP partagée : session keep-alive, timeouts, reprises et métriques.
+
+    Toutes les requêtes passent par une même requests.Session, dont le pool
+    garde les connexions TLS ouvertes vers Thingsboard : la poignée de main
+    n'est payée qu'une fois par connexion. Les erreurs de connexion et les
+    statuts RETRY_STATUSES sont retentés au plus `retries` fois avec une
+    attente exponentielle ; un POST n'est rejoué que dans les cas décrits
+    par PostSafeRetry. La latence de chaque appel (reprises comprises)
+    alimente un histogramme par méthode et chemin d'URL.
+    """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=MAX_RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE):
+        self.timeout = timeout
+        retry = PostSafeRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        """Envoie une requête ; mêmes arguments que requests.Session.request."""
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.monotonic()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            self._observe(f"{method} {urlsplit(url).path}", (time.monotonic() - start) * 1000)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _observe(self, endpoint, latency_ms):
+        with self._lock:
+            histogram = self._histograms.get(endpoint)
+            if histogram is None:
+                histogram = self._histograms[endpoint] = LatencyHistogram()
+            histogram.observe(latency_ms)
+
+    def stats(self):
+        """Histogrammes de latence par point d'accès."""
+        with self._lock:
+            return {endpoint: h.snapshot() for endpoint, h in self._histograms.items()}
+
+
+# Transport partagé par les modules d'un même processus
+transport = HttpTransport()
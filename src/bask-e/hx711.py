@@ -1,7 +1,10 @@
 import gpiod
 import time
 import threading
+from array import array
 from logzero import logger
+from quick2wire.selector import Selector
+from hx711_filters import make_filter
 
 # from https://developer.nvidia.com/embedded/learn/jetson-nano-2gb-devkit-user-guide
 DEFAULT_LINE_MAP: dict[str, dict] = {
@@ -38,6 +41,38 @@ DEFAULT_LINE_MAP: dict[str, dict] = {
 }
 DEFAULT_GPIOD_CONSUMER='hx711'
 
+# Number of data bits in one HX711 conversion.
+FRAME_DATA_BITS:int = 24
+
+# Byte value with its bit order reversed, used to honour bit_format == 'LSB'
+# without clocking the frame byte by byte.
+BIT_REVERSE_TABLE:tuple = tuple(int(f"{b:08b}"[::-1], 2) for b in range(256))
+
+# Seconds to wait for DOUT to signal a conversion before giving up. The HX711
+# converts at 10 or 80 SPS and needs 400 ms to settle after power up.
+DEFAULT_READY_TIMEOUT:float = 1.0
+
+# Number of raw samples kept by the streaming ring buffer.
+DEFAULT_STREAM_CAPACITY:int = 256
+
+# Seconds between two checks of the ring buffer while a reader waits for
+# samples that the streaming thread has not captured yet.
+STREAM_POLL_INTERVAL:float = 0.005
+
+# Window of the named incremental filters used by read_filtered().
+DEFAULT_FILTER_WINDOW:int = 32
+
+
+class _LineEventFd:
+    """Exposes a gpiod line event fd through the fileno() protocol used by Selector."""
+
+    def __init__(self, fd:int):
+        self.fd = fd
+
+    def fileno(self) -> int:
+        return self.fd
+
+
 class HX711:
 
      
@@ -53,7 +88,8 @@ class HX711:
         return address_num * 8 + offset
 
 
-    def __init__(self, dout:int, pd_sck:int, gain:int = 128, mutex:bool = False, chip = None, line_map_name:str = 'JETSON_NANO', custome_line_map:dict = None):
+    def __init__(self, dout:int, pd_sck:int, gain:int = 128, mutex:bool = False, chip = None, line_map_name:str = 'JETSON_NANO', custome_line_map:dict = None,
+                 edge_wait:bool = False, ready_timeout:float = DEFAULT_READY_TIMEOUT):
         self.line_map = None
         if line_map_name in DEFAULT_LINE_MAP:
             self.line_map = DEFAULT_LINE_MAP[line_map_name]
@@ -73,9 +109,17 @@ class HX711:
             # software try to access get values from the class at the same time.
             self.readLock = threading.Lock()
         
+        # With edge_wait, DOUT is requested for falling edge events so that
+        # wait_ready() can sleep on the line event fd instead of spinning.
+        self.edge_wait:bool = edge_wait
+        self.ready_timeout:float = ready_timeout
+
         config_dout = gpiod.line_request()
         config_dout.consumer = DEFAULT_GPIOD_CONSUMER
-        config_dout.request_type = gpiod.line_request.DIRECTION_INPUT
+        if self.edge_wait:
+            config_dout.request_type = gpiod.line_request.EVENT_FALLING_EDGE
+        else:
+            config_dout.request_type = gpiod.line_request.DIRECTION_INPUT
 
         config_sck = gpiod.line_request()
         config_sck.consumer = DEFAULT_GPIOD_CONSUMER
@@ -83,8 +127,15 @@ class HX711:
 
         self.PD_SCK.request(config_sck)
         self.DOUT.request(config_dout)
+
+        self.selector = None
+        if self.edge_wait:
+            self.selector = Selector(1)
+            self.selector.add(_LineEventFd(self.DOUT.event_get_fd()))
         
         self.GAIN:int = 0
+        self._data_bits:range = range(FRAME_DATA_BITS)
+        self._gain_bits:range = range(0)
 
         # The value returned by the hx711 that corresponds to your reference
         # unit AFTER dividing by the SCALE.
@@ -98,6 +149,25 @@ class HX711:
         self.byte_format:str = 'MSB'
         self.bit_format:str = 'MSB'
 
+        # Streaming mode state, see start_streaming().
+        self.streaming:bool = False
+        self._stream_thread:threading.Thread = None
+        self._stream_stop:threading.Event = threading.Event()
+        self._ring:array = None
+        self._ring_ts:array = None
+        self._ring_capacity:int = 0
+        self._ring_written:int = 0
+        self._ring_start:int = 0
+        # Held by the reader thread from reading a sample until it is in the
+        # ring, and by set_gain(): no sample read at the previous gain can be
+        # published after the switch.
+        self._stream_lock:threading.Lock = threading.Lock()
+
+        # Incremental filters used by read_filtered(), keyed by name or by
+        # filter object, with the streamed sample count they have consumed.
+        self.filter_window:int = DEFAULT_FILTER_WINDOW
+        self._filters:dict = {}
+
         self.set_gain(gain)
 
         # Think about whether this is necessary.
@@ -110,20 +180,61 @@ class HX711:
 
     def is_ready(self) -> bool:
         return self.DOUT.get_value() == 0
+
+
+    def wait_ready(self):
+        """Block until the HX711 has a conversion ready on DOUT.
+
+        In edge_wait mode the calling thread sleeps on the DOUT event fd,
+        otherwise it spins on is_ready().  Raises TimeoutError when nothing
+        shows up within ready_timeout seconds (load cell unplugged, chip
+        powered down); a ready_timeout of None waits forever.
+        """
+        if self.is_ready():
+            return
+
+        if self.edge_wait:
+            # Falling edges queued while the previous frame was clocked out
+            # are stale, drop them before going to sleep.  DOUT is checked
+            # again afterwards in case the real edge was dropped with them.
+            self.selector.wait(0)
+            while self.selector.ready is not None:
+                self.DOUT.event_read()
+                self.selector.wait(0)
+            if self.is_ready():
+                return
+
+            self.selector.wait(-1 if self.ready_timeout is None else self.ready_timeout)
+            if self.selector.ready is None and not self.is_ready():
+                raise TimeoutError(f"HX711::wait_ready(): no conversion within {self.ready_timeout}s")
+            return
+
+        deadline = None if self.ready_timeout is None else time.monotonic() + self.ready_timeout
+        while not self.is_ready():
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"HX711::wait_ready(): no conversion within {self.ready_timeout}s")
     
      
     def set_gain(self, gain):
-        if gain == 128:
-            self.GAIN = 1
-        elif gain == 64:
-            self.GAIN = 3
-        elif gain == 32:
-            self.GAIN = 2
-
-        self.PD_SCK.set_value(0)
-
-        # Read out a set of raw bytes and throw it away.
-        self.readRawBytes()
+        with self._stream_lock:
+            if gain == 128:
+                self.GAIN = 1
+            elif gain == 64:
+                self.GAIN = 3
+            elif gain == 32:
+                self.GAIN = 2
+            self._gain_bits = range(self.GAIN)
+
+            self.PD_SCK.set_value(0)
+
+            # Read out a set of raw bytes and throw it away.
+            self.readRawFrame()
+
+            # Samples streamed or filtered before the switch belong to the
+            # previous channel/gain.
+            self._ring_start = self._ring_written
+            for state in self._filters.values():
+                state[0].reset()
      
      
     def get_gain(self) -> int:
@@ -164,31 +275,85 @@ class HX711:
        return byteValue 
 
      
-    def readRawBytes(self) -> list[int]:
+    def readRawFrame(self) -> int:
+        """Clock a whole 24 data bit + gain frame out of the HX711.
+
+        Returns the raw 24bit value, already reordered according to
+        byte_format/bit_format.  The line methods are bound once so the
+        clock loop is only calls and integer shifts: no attribute lookups,
+        no per-bit method frames and no list building.
+        """
         if self.mutex_flag:
             # Wait for and get the Read Lock, incase another thread is already
             # driving the HX711 serial interface.
             self.readLock.acquire()
 
-        # Wait until HX711 is ready for us to read a sample.
-        while not self.is_ready():
-           pass
-
-        # Read three bytes of data from the HX711.
-        firstByte:int  = self.readNextByte()
-        secondByte:int = self.readNextByte()
-        thirdByte:int  = self.readNextByte()
+        try:
+            # Wait until HX711 is ready for us to read a sample.
+            self.wait_ready()
+
+            sck_set = self.PD_SCK.set_value
+            dout_get = self.DOUT.get_value
+
+            # DOUT is stable once PD_SCK is lowered again (see readNextBit).
+            value:int = 0
+            for _ in self._data_bits:
+                sck_set(1)
+                sck_set(0)
+                value = (value << 1) | dout_get()
+
+            # HX711 Channel and gain factor are set by number of pulses after
+            # the 24 data bits (25, 26 or 27 pulses per frame).
+            for _ in self._gain_bits:
+                sck_set(1)
+                sck_set(0)
+        finally:
+            if self.mutex_flag:
+                # Release the Read Lock, now that we've finished driving the
+                # HX711 serial interface.
+                self.readLock.release()
+
+        if self.byte_format == 'MSB' and self.bit_format == 'MSB':
+            return value
+
+        firstByte:int  = value >> 16
+        secondByte:int = (value >> 8) & 0xFF
+        thirdByte:int  = value & 0xFF
+        if self.bit_format == 'LSB':
+            firstByte = BIT_REVERSE_TABLE[firstByte]
+            secondByte = BIT_REVERSE_TABLE[secondByte]
+            thirdByte = BIT_REVERSE_TABLE[thirdByte]
+        if self.byte_format == 'LSB':
+            firstByte, thirdByte = thirdByte, firstByte
+        return (firstByte << 16) | (secondByte << 8) | thirdByte
 
-        # HX711 Channel and gain factor are set by number of bits read
-        # after 24 data bits.
-        for i in range(self.GAIN):
-           # Clock a bit out of the HX711 and throw it away.
-           self.readNextBit()
 
+    # Byte by byte acquisition path, kept for bench_hx711.py comparisons.
+    def readRawBytes(self) -> list[int]:
         if self.mutex_flag:
-            # Release the Read Lock, now that we've finished driving the HX711
-            # serial interface.
-            self.readLock.release()           
+            # Wait for and get the Read Lock, incase another thread is already
+            # driving the HX711 serial interface.
+            self.readLock.acquire()
+
+        try:
+            # Wait until HX711 is ready for us to read a sample.
+            self.wait_ready()
+
+            # Read three bytes of data from the HX711.
+            firstByte:int  = self.readNextByte()
+            secondByte:int = self.readNextByte()
+            thirdByte:int  = self.readNextByte()
+
+            # HX711 Channel and gain factor are set by number of bits read
+            # after 24 data bits.
+            for i in range(self.GAIN):
+               # Clock a bit out of the HX711 and throw it away.
+               self.readNextBit()
+        finally:
+            if self.mutex_flag:
+                # Release the Read Lock, now that we've finished driving the
+                # HX711 serial interface.
+                self.readLock.release()
 
         # Depending on how we're configured, return an orderd list of raw byte
         # values.
@@ -199,17 +364,14 @@ class HX711:
 
           
     def read_long(self) -> int:
-        # Get a sample from the HX711 in the form of raw bytes.
-        dataBytes:list[int] = self.readRawBytes()
+        # In streaming mode the reader thread owns the bus, hand back the
+        # latest sample it captured.
+        if self.streaming:
+            return self.latest_samples(1)[0]
 
+        # Get a sample from the HX711 as a single 24bit 2s complement value.
+        twosComplementValue:int = self.readRawFrame()
 
-        
-        # Join the raw bytes into a single 24bit 2s complement value.
-        twosComplementValue = ((dataBytes[0] << 16) |
-                               (dataBytes[1] << 8)  |
-                               dataBytes[2])
-
-        
         # Convert from 24bit twos-complement to a signed value.
         signedIntValue:int = self.convertFromTwosComplement24bit(twosComplementValue)
 
@@ -220,6 +382,13 @@ class HX711:
         return int(signedIntValue)
     
 
+    def collect_samples(self, times:int) -> list[int]:
+        # Streamed samples are already there, otherwise clock fresh ones.
+        if self.streaming:
+            return self.latest_samples(times)
+        return [self.read_long() for x in range(times)]
+
+
     def read_average(self, times:int = 3) -> float:
         # Make sure we've been asked to take a rational amount of samples.
         if times <= 0:
@@ -236,10 +405,7 @@ class HX711:
 
         # If we're taking a lot of samples, we'll collect them in a list, remove
         # the outliers, then take the mean of the remaining set.
-        valueList:list[int] = []
-
-        for x in range(times):
-            valueList += [self.read_long()]
+        valueList:list[int] = self.collect_samples(times)
 
         valueList.sort()
 
@@ -263,10 +429,7 @@ class HX711:
        if times == 1:
           return self.read_long()
 
-       valueList:list[int] = []
-
-       for x in range(times):
-          valueList += [self.read_long()]
+       valueList:list[int] = self.collect_samples(times)
 
        valueList.sort()
 
@@ -276,17 +439,56 @@ class HX711:
        else:
           # If times is even we have to take the arithmetic mean of
           # the two middle values.
-          midpoint:int = len(valueList) / 2
-          return sum(valueList[midpoint:midpoint+2]) / 2.0
+          midpoint:int = len(valueList) // 2
+          return sum(valueList[midpoint-1:midpoint+1]) / 2.0
+
+
+    def read_filtered(self, filter, times:int = 3) -> float:
+        """Push new samples through an incremental filter and return its output.
+
+        `filter` is one of hx711_filters.FILTERS ('median', 'trimmed_mean',
+        'ema'), created once with a filter_window samples window, or any
+        object with push()/value/reset()/__len__.  With streaming the filter
+        keeps its window between calls, so each call only needs new samples:
+        every sample captured since the previous call is pushed (at least
+        `times` the first time).  Without streaming the samples of a
+        previous call may be arbitrarily old, so the filter is reset and
+        fed `times` fresh conversions.
+        """
+        if times <= 0:
+            raise ValueError("HX711::read_filtered(): times must be greater than zero!")
+
+        state:list = self._filters.get(filter)
+        if state is None:
+            f = make_filter(filter, self.filter_window) if isinstance(filter, str) else filter
+            state = self._filters[filter] = [f, 0]
+        f = state[0]
+
+        if not self.streaming:
+            f.reset()
+            for x in range(times):
+                f.push(self.read_long())
+            return f.value
+
+        if len(f) == 0:
+            self._wait_for_samples(min(times, self._ring_capacity))
+        values, stamps, state[1] = self.samples_since(state[1])
+        for value in values:
+            f.push(value)
+        return f.value
 
      
     # Compatibility function, uses channel A version
-    def get_value(self, times:int = 3) -> float:
-        return self.get_value_A(times)
+    def get_value(self, times:int = 3, filter = None) -> float:
+        return self.get_value_A(times, filter)
 
 
-    def get_value_A(self, times:int = 3) -> float:
-        return self.read_median(times) - self.get_offset_A()
+    # `filter` selects an incremental filter (see read_filtered()) instead of
+    # the median of `times` samples.
+    def get_value_A(self, times:int = 3, filter = None) -> float:
+        if filter is None:
+            return self.read_median(times) - self.get_offset_A()
+        return self.read_filtered(filter, times) - self.get_offset_A()
 
 
     def get_value_B(self, times:int = 3) -> float:
@@ -299,12 +501,12 @@ class HX711:
 
      
     # Compatibility function, uses channel A version
-    def get_weight(self, times:int = 3) -> float:
-        return self.get_weight_A(times)
+    def get_weight(self, times:int = 3, filter = None) -> float:
+        return self.get_weight_A(times, filter)
 
 
-    def get_weight_A(self, times:int = 3) -> float:
-        value:float = self.get_value_A(times)
+    def get_weight_A(self, times:int = 3, filter = None) -> float:
+        value:float = self.get_value_A(times, filter)
         value = value / self.REFERENCE_UNIT
         return value
 
@@ -424,6 +626,133 @@ class HX711:
         return self.REFERENCE_UNIT_B
         
         
+    def start_streaming(self, capacity:int = DEFAULT_STREAM_CAPACITY):
+        """Start a reader thread that keeps the HX711 conversions in a ring buffer.
+
+        The thread clocks every conversion at the ADC's native rate into a
+        preallocated array('i') of raw signed samples, with a matching
+        array('q') of time.monotonic_ns() timestamps.  read_long(),
+        read_average(), read_median() and everything built on them then read
+        the latest samples instead of waiting for new conversions.
+
+        The thread is the only writer and publishes a sample by bumping the
+        write counter after filling its slot, so readers never take a lock.
+        Use a capacity well above the largest window that will be read.
+        """
+        if self.streaming:
+            return
+
+        # The reader thread and power_down()/set_gain() share the bus.
+        if not self.mutex_flag:
+            self.readLock = threading.Lock()
+            self.mutex_flag = True
+
+        self._ring = array('i', [0]) * capacity
+        self._ring_ts = array('q', [0]) * capacity
+        self._ring_capacity = capacity
+        self._ring_written = 0
+        self._ring_start = 0
+
+        self._stream_stop.clear()
+        self._stream_thread = threading.Thread(target=self._stream_loop, name="hx711-stream", daemon=True)
+        self.streaming = True
+        self._stream_thread.start()
+
+
+    def stop_streaming(self):
+        if not self.streaming:
+            return
+        self._stream_stop.set()
+        self._stream_thread.join()
+        self._stream_thread = None
+        self.streaming = False
+
+
+    def _stream_loop(self):
+        ring:array = self._ring
+        ring_ts:array = self._ring_ts
+        capacity:int = self._ring_capacity
+
+        while not self._stream_stop.is_set():
+            try:
+                # Wait outside the locks so power_down() and set_gain() are
+                # not held off for a whole conversion period.
+                self.wait_ready()
+                with self._stream_lock:
+                    value:int = self.convertFromTwosComplement24bit(self.readRawFrame())
+
+                    written:int = self._ring_written
+                    slot:int = written % capacity
+                    ring[slot] = value
+                    ring_ts[slot] = time.monotonic_ns()
+                    self._ring_written = written + 1
+            except TimeoutError:
+                # Powered down or unplugged, keep trying until stopped.
+                continue
+            self.lastVal = value
+
+
+    def samples_written(self) -> int:
+        """Total number of samples captured since streaming started."""
+        return self._ring_written
+
+
+    def latest_samples(self, times:int, with_timestamps:bool = False):
+        """Return the `times` latest streamed samples, oldest first.
+
+        Only waits while fewer than `times` samples have been captured since
+        streaming started or the gain last changed.  With with_timestamps,
+        returns a (samples, timestamps_ns) tuple.
+        """
+        if not self.streaming:
+            raise RuntimeError("HX711::latest_samples(): streaming is not started!")
+        if times <= 0 or times > self._ring_capacity:
+            raise ValueError(f"HX711::latest_samples(): times must be in [1, {self._ring_capacity}]!")
+
+        self._wait_for_samples(times)
+
+        end:int = self._ring_written
+        values:list[int] = self._ring_window(self._ring, end, times)
+        if with_timestamps:
+            return values, self._ring_window(self._ring_ts, end, times)
+        return values
+
+
+    def samples_since(self, since:int):
+        """Return (samples, timestamps_ns, end) for the samples captured after `since`.
+
+        `since` is a samples_written() count, pass `end` back on the next
+        call to get the following samples.  Samples already overwritten in
+        the ring, or captured before the last gain change, are skipped.
+        """
+        end:int = self._ring_written
+        fresh:int = min(end - max(since, self._ring_start), self._ring_capacity)
+        if fresh <= 0:
+            return [], [], end
+        return self._ring_window(self._ring, end, fresh), self._ring_window(self._ring_ts, end, fresh), end
+
+
+    def _wait_for_samples(self, times:int):
+        if self._ring_written - self._ring_start >= times:
+            return
+        deadline = None
+        if self.ready_timeout is not None:
+            deadline = time.monotonic() + self.ready_timeout * times
+        while self._ring_written - self._ring_start < times:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"HX711::latest_samples(): {times} samples not captured in time")
+            time.sleep(STREAM_POLL_INTERVAL)
+
+
+    def _ring_window(self, ring:array, end:int, times:int) -> list:
+        capacity:int = self._ring_capacity
+        start:int = (end - times) % capacity
+        stop:int = start + times
+        if stop <= capacity:
+            return ring[start:stop].tolist()
+        return ring[start:].tolist() + ring[:stop - capacity].tolist()
+
+
     def power_down(self):
         if self.mutex_flag:
             # Wait for and get the Read Lock, incase another thread is already
@@ -466,7 +795,7 @@ class HX711:
         # throw it away, so that next sample from the HX711 will be from the
         # correct channel/gain.
         if self.get_gain() != 128:
-            self.readRawBytes()
+            self.readRawFrame()
 
 
     def reset(self):
@@ -0,0 +1,159 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+# Share of the samples trimmed from each end of the window by the trimmed
+# mean, same as HX711.read_average().
+DEFAULT_TRIM:float = 0.2
+
+
+class SlidingMedian:
+    """Median of the last `window` samples, updated incrementally.
+
+    The window is kept sorted with bisect, so a push costs one binary search
+    and one memmove per inserted/evicted sample and reading the median is
+    O(1).  For the 32-64 sample windows used on the scale this is cheaper in
+    CPython than a two-heap median with lazy deletion.
+    """
+
+    def __init__(self, window:int):
+        if window <= 0:
+            raise ValueError("SlidingMedian(): window must be >= 1!")
+        self.window:int = window
+        self._fifo:deque = deque()
+        self._sorted:list = []
+
+    def __len__(self) -> int:
+        return len(self._fifo)
+
+    def reset(self):
+        self._fifo.clear()
+        self._sorted.clear()
+
+    def push(self, value:int):
+        s:list = self._sorted
+        if len(self._fifo) == self.window:
+            del s[bisect_left(s, self._fifo.popleft())]
+        s.insert(bisect_right(s, value), value)
+        self._fifo.append(value)
+
+    @property
+    def value(self) -> float:
+        s:list = self._sorted
+        n:int = len(s)
+        if n == 0:
+            raise ValueError("SlidingMedian::value: no sample pushed yet!")
+        mid:int = n // 2
+        if n & 0x1:
+            return s[mid]
+        return (s[mid - 1] + s[mid]) / 2.0
+
+
+class SlidingTrimmedMean(SlidingMedian):
+    """Mean of the last `window` samples once `trim` of them are cut from each end.
+
+    The sum of the kept middle slice is maintained across pushes: each
+    insertion or eviction only moves the slice boundaries by one element, so
+    the mean is read in O(1) instead of re-summing the window.
+    """
+
+    def __init__(self, window:int, trim:float = DEFAULT_TRIM):
+        if not 0.0 <= trim < 0.5:
+            raise ValueError("SlidingTrimmedMean(): trim must be in [0, 0.5)!")
+        super().__init__(window)
+        self.trim:float = trim
+        # Samples trimmed from each end and sum of the kept ones.
+        self._k:int = 0
+        self._mid_sum:int = 0
+
+    def reset(self):
+        super().reset()
+        self._k = 0
+        self._mid_sum = 0
+
+    def push(self, value:int):
+        s:list = self._sorted
+        k:int = self._k
+
+        if len(self._fifo) == self.window:
+            i:int = bisect_left(s, self._fifo.popleft())
+            n:int = len(s)
+            # The kept slice [k, n - k) loses the evicted sample, or its
+            # nearest boundary element if the sample was trimmed.
+            self._mid_sum -= s[min(max(i, k), n - k - 1)]
+            del s[i]
+            n -= 1
+            if int(n * self.trim) < k:
+                # Fewer samples trimmed: the slice grows by one at each end.
+                self._mid_sum += s[k - 1] + s[n - k]
+                k -= 1
+
+        n:int = len(s)
+        i:int = bisect_right(s, value)
+        s.insert(i, value)
+        # The kept slice gains the new sample, or the boundary element it
+        # pushed inwards if the sample lands in a trimmed end.
+        self._mid_sum += s[min(max(i, k), n - k)]
+        n += 1
+        if int(n * self.trim) > k:
+            # More samples trimmed: the slice shrinks by one at each end.
+            self._mid_sum -= s[k] + s[n - k - 1]
+            k += 1
+
+        self._k = k
+        self._fifo.append(value)
+
+    @property
+    def value(self) -> float:
+        n:int = len(self._sorted)
+        if n == 0:
+            raise ValueError("SlidingTrimmedMean::value: no sample pushed yet!")
+        return self._mid_sum / (n - 2 * self._k)
+
+
+class ExponentialMovingAverage:
+    """Exponential moving average, value += alpha * (sample - value)."""
+
+    def __init__(self, alpha:float):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("ExponentialMovingAverage(): alpha must be in (0, 1]!")
+        self.alpha:float = alpha
+        self._count:int = 0
+        self._value:float = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def reset(self):
+        self._count = 0
+        self._value = 0.0
+
+    def push(self, value:int):
+        if self._count == 0:
+            self._value = float(value)
+        else:
+            self._value += self.alpha * (value - self._value)
+        self._count += 1
+
+    @property
+    def value(self) -> float:
+        if self._count == 0:
+            raise ValueError("ExponentialMovingAverage::value: no sample pushed yet!")
+        return self._value
+
+
+FILTERS:tuple = ('median', 'trimmed_mean', 'ema')
+
+
+def make_filter(name:str, window:int):
+    """Build the filter called `name` for a `window` samples window.
+
+    The EMA gets the smoothing factor of a `window` samples simple average,
+    2 / (window + 1).
+    """
+    if name == 'median':
+        return SlidingMedian(window)
+    if name == 'trimmed_mean':
+        return SlidingTrimmedMean(window)
+    if name == 'ema':
+        return ExponentialMovingAverage(2.0 / (window + 1))
+    raise ValueError(f"Unrecognised filter: \"{name}\"")
@@ -1,4 +1,4 @@
-from requests import post
+from http_transport import transport
 from time import sleep
 import threading
 
@@ -23,8 +23,8 @@ def get_auth_token(config):
     """
     Récupère le token d'authentification via une requête HTTP.
     """
-    response = post(f"https://{config['host']}/api/auth/login",
-                    json={ "username": config["username"], "password": config["password"] })
+    response = transport.post(f"https://{config['host']}/api/auth/login",
+                              json={ "username": config["username"], "password": config["password"] })
     if response.status_code == 200:
         return response.json().get("token")
     else:
@@ -39,9 +39,9 @@ def send_online_status(config, auth_token):
         if health_check_active:
             headers = {"Authorization": f"Bearer {auth_token}"}
             # Envoi HTTP
-            response = post(f"https://{config['host']}/api/v1/{config['token']}/telemetry",
-                            headers=headers,
-                            json={"status": "online"})
+            response = transport.post(f"https://{config['host']}/api/v1/{config['token']}/telemetry",
+                                      headers=headers,
+                                      json={"status": "online"})
             if response.status_code == 200:
                 print("Statut envoyé : online via HTTP")
             else:
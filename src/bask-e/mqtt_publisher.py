@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+import paho.mqtt.client as mqtt
+
+# Nombre maximal de topics en attente d'envoi
+MAX_PENDING_TOPICS = 32
+
+
+class CoalescingPublisher:
+    """Publication MQTT non bloquante, un seul message en vol par topic.
+
+    publish() ne fait que confier le message au client paho et rend la main
+    immédiatement. Tant que le message précédent d'un topic n'est pas
+    acquitté par le thread réseau paho (callback on_publish), les nouveaux
+    messages de ce topic restent en attente et seul le plus récent est
+    conservé : le thread réseau envoie ce dernier dès l'acquittement. La file
+    d'attente est bornée à `max_pending` topics, les plus anciens sont
+    abandonnés au-delà.
+
+    Le publisher remplace le callback on_publish du client.
+    """
+
+    def __init__(self, client, max_pending=MAX_PENDING_TOPICS):
+        self.client = client
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # topic -> (payload, qos, retain)
+        self._in_flight = {}  # mid -> topic
+        self._busy = set()  # topics avec un message en vol
+        self._early_acks = set()  # mids acquittés avant le retour de publish()
+
+        # Compteurs
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+        client.on_publish = self._on_publish
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Publie sans attendre le broker ; fusionne avec le message en attente du topic."""
+        with self._lock:
+            if topic in self._busy:
+                self._enqueue(topic, (payload, qos, retain))
+                return
+            self._busy.add(topic)
+        self._send(topic, payload, qos, retain)
+
+    def flush(self):
+        """Renvoie les messages en attente, à appeler après une (re)connexion.
+
+        Les messages en vol lors d'une déconnexion ne seront jamais acquittés :
+        leurs topics sont libérés.
+        """
+        with self._lock:
+            self._in_flight.clear()
+            self._early_acks.clear()
+            self._busy.clear()
+            pending = list(self._pending.items())
+            self._pending.clear()
+            self._busy.update(topic for topic, _ in pending)
+        for topic, (payload, qos, retain) in pending:
+            self._send(topic, payload, qos, retain)
+
+    def stats(self):
+        """Compteurs de publication et taille de la file d'attente."""
+        with self._lock:
+            return {
+                'published': self.published,
+                'delivered': self.delivered,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'pending': len(self._pending),
+                'in_flight': len(self._in_flight)
+            }
+
+    # ------------ Interne ------------
+
+    def _enqueue(self, topic, message):
+        # Appelé avec self._lock acquis.
+        if topic in self._pending:
+            self.coalesced += 1
+        elif len(self._pending) >= self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._pending[topic] = message
+
+    def _send(self, topic, payload, qos, retain):
+        # client.publish() est appelé hors du verrou : paho peut déclencher
+        # on_publish depuis son thread réseau avant même de rendre la main.
+        info = self.client.publish(topic, payload, qos, retain)
+        with self._lock:
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                # Hors connexion : le message est gardé pour flush(), sauf
+                # s'il a déjà été remplacé entre-temps, dans la même file
+                # bornée que publish().
+                self.failed += 1
+                self._busy.discard(topic)
+                if topic not in self._pending:
+                    self._enqueue(topic, (payload, qos, retain))
+                return
+            self.published += 1
+            if info.mid in self._early_acks:
+                self._early_acks.discard(info.mid)
+                next_message = self._acknowledge(topic)
+            else:
+                self._in_flight[info.mid] = topic
+                return
+        if next_message:
+            self._send(topic, *next_message)
+
+    def _acknowledge(self, topic):
+        # Appelé avec self._lock acquis : libère le topic ou retourne son
+        # prochain message en attente (le topic reste alors occupé).
+        self.delivered += 1
+        next_message = self._pending.pop(topic, None)
+        if next_message is None:
+            self._busy.discard(topic)
+        return next_message
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        """Callback paho (thread réseau) : message acquitté, envoi du suivant."""
+        with self._lock:
+            topic = self._in_flight.pop(mid, None)
+            if topic is None:
+                self._early_acks.add(mid)
+                return
+            next_message = self._acknowledge(topic)
+        if next_message:
+            self._send(topic, *next_message)
@@ -1,8 +1,10 @@
 import time
 import sys
-import json
 import gpiod
 from hx711 import HX711
+from step_detector import StepDetector
+from mqtt_publisher import CoalescingPublisher
+from weight_codec import encode_weight_event, encode_weight_event_json
 import paho.mqtt.client as mqtt
 
 # --------------------- Configuration ---------------------
@@ -10,7 +12,30 @@ import paho.mqtt.client as mqtt
 # Configuration de la balance
 REFERENCE_UNIT = 1
 THRESHOLD = 25  # Seuil pour poids en grammes
-PRECISION = 5  # Imprécision acceptable en grammes
+
+# Détection des changements de poids (voir step_detector.StepDetector). Le
+# détecteur tourne à la cadence native du HX711 : avec la broche RATE à 80 SPS,
+# SETTLE_SAMPLES échantillons représentent ~40 ms.
+STEP_THRESHOLD = 15  # Écart cumulé (g) déclenchant la détection d'un saut
+STEP_DRIFT = 3  # Bruit toléré (g) par échantillon
+SETTLE_SAMPLES = 3  # Échantillons stables requis avant publication
+SETTLE_TOLERANCE = 4  # Écart max (g) dans la fenêtre de stabilisation
+MIN_STEP = 5  # Variation minimale (g) publiée
+
+# Mise en veille du HX711 : après IDLE_POWER_DOWN_DELAY secondes sans
+# changement, la balance est éteinte IDLE_SLEEP secondes puis rallumée pour
+# IDLE_WAKE_SAMPLES échantillons. None désactive la mise en veille.
+IDLE_POWER_DOWN_DELAY = 60
+IDLE_SLEEP = 0.5
+IDLE_WAKE_SAMPLES = 8
+# Conversions ignorées après le réveil, le temps que le HX711 se stabilise
+# (4 conversions d'après la fiche technique) : elles ressembleraient à un saut.
+WAKE_SETTLE_SAMPLES = 4
+
+TARE_SAMPLES = 50  # Nouveaux échantillons moyennés pour la tare
+TARE_TIMEOUT = 10  # secondes
+
+SAMPLE_POLL_INTERVAL = 0.005  # Attente (s) entre deux lectures du tampon d'échantillons
 
 FIRST_RECONNECT_DELAY = 1
 RECONNECT_RATE = 2
@@ -21,6 +46,11 @@ MAX_RECONNECT_DELAY = 60
 MQTT_BROKER = "mqtt.eclipseprojects.io"
 MQTT_PORT = 1883
 MQTT_TOPIC_WEIGHT = "scale/weight"
+MQTT_TOPIC_WEIGHT_BIN = "scale/weight/bin"  # Même événement, format binaire (weight_codec)
+# Les services (app, app_async, mqtt_yolo_screen) lisent le topic binaire ;
+# le JSON ne sert qu'au moniteur de débogage test.py : à activer pour lui.
+PUBLISH_JSON = False
+PUBLISH_BINARY = True
 
 # Variables globales
 previous_weight = 0  # Dernier poids enregistré
@@ -29,12 +59,15 @@ previous_weight = 0  # Dernier poids enregistré
 chip = None
 hx = None
 mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+# Publication non bloquante : la boucle de mesure n'attend jamais le réseau.
+publisher = CoalescingPublisher(mqtt_client)
 
 # --------------------- Fonctions Utilitaires ---------------------
 
 def clean_and_exit():
     """Effectue un nettoyage propre et quitte le programme."""
     print("Nettoyage en cours...")
+    print(f"Statistiques de publication : {publisher.stats()}")
     try:
         mqtt_client.disconnect()
     except Exception as e:
@@ -48,24 +81,43 @@ def initialize_hx711():
     global chip, hx
     try:
         chip = gpiod.chip("/dev/gpiochip0", gpiod.chip.OPEN_BY_PATH)
-        hx = HX711(dout=11, pd_sck=7, chip=chip)
+        hx = HX711(dout=11, pd_sck=7, chip=chip, edge_wait=True)
 
         hx.set_reading_format("MSB", "MSB")
         hx.set_reference_unit(REFERENCE_UNIT)
         hx.reset()
+        # Les conversions sont capturées en continu par un thread dédié : les
+        # lectures de poids ne font que parcourir les derniers échantillons.
+        hx.start_streaming()
         tare_with_average()
         print("Balance initialisée et tare effectuée.")
     except Exception as e:
         print(f"Erreur lors de l'initialisation de la balance : {e}")
         clean_and_exit()
 
-def tare_with_average(num_samples=10):
-    """Effectue la tare avec une moyenne basée sur plusieurs lectures."""
+def wait_fresh_samples(count, skip=0, timeout=TARE_TIMEOUT):
+    """Attend `count` nouveaux échantillons bruts, après en avoir ignoré `skip`."""
+    seen = hx.samples_written() + skip
+    collected = []
+    deadline = time.monotonic() + timeout
+    while len(collected) < count:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{count} échantillons non reçus en {timeout} s")
+        samples, _, end = hx.samples_since(seen)
+        if samples:
+            collected.extend(samples)
+            seen = end
+        else:
+            time.sleep(SAMPLE_POLL_INTERVAL)
+    return collected[:count]
+
+def tare_with_average(num_samples=TARE_SAMPLES):
+    """Effectue la tare sur la moyenne de nouveaux échantillons, une fois le HX711 stabilisé."""
     try:
-        total = sum(hx.get_weight(5) for _ in range(num_samples))
-        average = total / num_samples
+        samples = wait_fresh_samples(num_samples, skip=WAKE_SETTLE_SAMPLES)
+        average = sum(samples) / num_samples
         hx.set_offset(average)
-        print(f"Tare réalisée avec une moyenne de {average:.2f} g.")
+        print(f"Tare réalisée sur {num_samples} échantillons (décalage {average:.2f}).")
     except Exception as e:
         print(f"Erreur lors de la tare : {e}")
         clean_and_exit()
@@ -74,6 +126,8 @@ def on_connect(client, userdata, flags, rc, other):
     """Callback exécuté lors de la connexion au broker MQTT."""
     if rc == 0:
         print(f"Connecté au broker MQTT : {MQTT_BROKER}:{MQTT_PORT}")
+        # Envoie les poids restés en attente pendant la déconnexion.
+        publisher.flush()
     else:
         print(f"Échec de connexion au broker MQTT, code : {rc}")
 
@@ -114,52 +168,74 @@ def initialize_mqtt():
 
 # --------------------- Gestion de la Balance ---------------------
 
-def read_weight():
-    """Lit le poids actuel de la balance."""
+def publish_weight(current_weight, weight_difference, timestamp_ns=None):
+    """Publie le poids actuel via MQTT sans attendre l'acquittement du broker."""
     try:
-        weight = max(0, hx.get_weight(5))  # Évite les valeurs négatives
-        print(f"Poids mesuré : {weight} g")
-        return weight
-    except Exception as e:
-        print(f"Erreur lors de la lecture du poids : {e}")
-        return 0
-
-def publish_weight(current_weight, weight_difference):
-    """Publie le poids actuel via MQTT."""
-    try:
-        payload = json.dumps({
-            'weight': current_weight,
-            'difference': weight_difference,
-            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
-        })
-        sg_info = mqtt_client.publish(MQTT_TOPIC_WEIGHT, payload)
-        sg_info.wait_for_publish()
+        if PUBLISH_JSON:
+            publisher.publish(MQTT_TOPIC_WEIGHT, encode_weight_event_json(current_weight, weight_difference))
+        if PUBLISH_BINARY:
+            publisher.publish(MQTT_TOPIC_WEIGHT_BIN, encode_weight_event(current_weight, weight_difference, timestamp_ns))
     except Exception as e:
         print(f"Erreur lors de la publication du poids : {e}")
 
 # --------------------- Boucle Principale ---------------------
 
+def to_grams(raw):
+    """Convertit un échantillon brut du HX711 en grammes."""
+    return max(0, (raw - hx.get_offset_A()) / hx.get_reference_unit_A())  # Évite les valeurs négatives
+
 def main_loop():
-    """Boucle principale pour lire et publier les poids."""
+    """Boucle principale : détecte les ajouts/retraits au fil des échantillons et les publie."""
     global previous_weight
 
+    detector = StepDetector(
+        baseline=previous_weight,
+        threshold=STEP_THRESHOLD,
+        drift=STEP_DRIFT,
+        settle_samples=SETTLE_SAMPLES,
+        settle_tolerance=SETTLE_TOLERANCE,
+        min_step=MIN_STEP
+    )
+    seen = hx.samples_written()
+    last_change = time.monotonic()
+    awake_until = seen
+    settle_until = seen
+
     try:
         while True:
-            # Lire le poids actuel
-            current_weight = read_weight()
-
-            # Calculer la différence de poids
-            weight_difference = current_weight - previous_weight
-
-            # Publier si la différence dépasse l'imprécision
-            if abs(weight_difference) > PRECISION:
-                publish_weight(current_weight, weight_difference)
-                previous_weight = current_weight  # Mettre à jour le poids précédent
-
-            # Réinitialiser la balance pour économiser l'énergie
-            hx.power_down()
-            hx.power_up()
-            time.sleep(0.5)
+            samples, stamps, end = hx.samples_since(seen)
+            # Conversions de stabilisation après un réveil : jamais transmises au détecteur.
+            skip = min(len(samples), settle_until - (end - len(samples)))
+            if skip > 0:
+                samples, stamps = samples[skip:], stamps[skip:]
+            seen = end
+
+            for raw, timestamp_ns in zip(samples, stamps):
+                event = detector.push(to_grams(raw), timestamp_ns)
+                if event is None:
+                    continue
+
+                publish_weight(event.weight, event.difference, event.settled_ns)
+                previous_weight = event.weight
+                last_change = time.monotonic()
+                latency = (time.monotonic_ns() - event.step_ns) / 1e6
+                print(f"Poids {event.weight:.1f} g ({event.action} {event.difference:+.1f} g), "
+                      f"latence {latency:.0f} ms")
+
+            # Mise en veille seulement après une période d'inactivité, jamais
+            # pendant la stabilisation d'un saut.
+            idle = (IDLE_POWER_DOWN_DELAY is not None
+                    and time.monotonic() - last_change > IDLE_POWER_DOWN_DELAY
+                    and not detector.settling
+                    and seen >= awake_until)
+            if idle:
+                hx.power_down()
+                time.sleep(IDLE_SLEEP)
+                hx.power_up()
+                settle_until = hx.samples_written() + WAKE_SETTLE_SAMPLES
+                awake_until = settle_until + IDLE_WAKE_SAMPLES
+            elif not samples:
+                time.sleep(SAMPLE_POLL_INTERVAL)
     except (KeyboardInterrupt, SystemExit):
         clean_and_exit()
 
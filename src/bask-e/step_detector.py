@@ -0,0 +1,87 @@
+from collections import deque
+
+# --------------------- Configuration par défaut ---------------------
+
+CUSUM_THRESHOLD = 15  # Écart cumulé (g) au-delà duquel un saut est détecté
+CUSUM_DRIFT = 3  # Bruit toléré (g) par échantillon avant accumulation
+SETTLE_SAMPLES = 3  # Échantillons consécutifs requis pour déclarer le poids stable
+SETTLE_TOLERANCE = 4  # Écart max (g) entre échantillons d'une fenêtre stable
+MIN_STEP = 5  # Variation minimale (g) publiée comme ajout/retrait
+
+
+class WeightEvent:
+    """Changement de poids confirmé par le détecteur."""
+
+    __slots__ = ('weight', 'difference', 'step_ns', 'settled_ns')
+
+    def __init__(self, weight, difference, step_ns, settled_ns):
+        self.weight = weight
+        self.difference = difference
+        # Horodatages time.monotonic_ns() du début du saut et de sa stabilisation.
+        self.step_ns = step_ns
+        self.settled_ns = settled_ns
+
+    @property
+    def action(self):
+        return 'add' if self.difference > 0 else 'remove'
+
+
+class StepDetector:
+    """Détecte les ajouts/retraits sur un flux de poids échantillon par échantillon.
+
+    Un CUSUM bilatéral compare chaque échantillon au poids de référence :
+    les petites variations (inférieures à `drift`) sont absorbées, un saut
+    franc dépasse `threshold` dès le premier échantillon. Le détecteur attend
+    ensuite `settle_samples` échantillons groupés à `settle_tolerance` près,
+    prend leur moyenne comme nouvelle référence et émet un WeightEvent si la
+    variation atteint `min_step`.
+    """
+
+    def __init__(self, baseline=0.0, threshold=CUSUM_THRESHOLD, drift=CUSUM_DRIFT,
+                 settle_samples=SETTLE_SAMPLES, settle_tolerance=SETTLE_TOLERANCE, min_step=MIN_STEP):
+        self.threshold = threshold
+        self.drift = drift
+        self.settle_tolerance = settle_tolerance
+        self.min_step = min_step
+        self.baseline = baseline
+        self._window = deque(maxlen=settle_samples)
+        self._pos = 0.0
+        self._neg = 0.0
+        self._step_ns = None
+
+    @property
+    def settling(self):
+        """Vrai entre la détection d'un saut et la stabilisation du poids."""
+        return self._step_ns is not None
+
+    def reset(self, baseline):
+        """Repart d'un poids de référence connu (après une tare par exemple)."""
+        self.baseline = baseline
+        self._window.clear()
+        self._pos = self._neg = 0.0
+        self._step_ns = None
+
+    def push(self, weight, timestamp_ns):
+        """Ajoute un échantillon (g) et retourne un WeightEvent ou None."""
+        if self._step_ns is None:
+            deviation = weight - self.baseline
+            self._pos = max(0.0, self._pos + deviation - self.drift)
+            self._neg = max(0.0, self._neg - deviation - self.drift)
+            if self._pos <= self.threshold and self._neg <= self.threshold:
+                return None
+            self._step_ns = timestamp_ns
+            self._window.clear()
+
+        window = self._window
+        window.append(weight)
+        if len(window) < window.maxlen or max(window) - min(window) > self.settle_tolerance:
+            return None
+
+        settled = sum(window) / len(window)
+        difference = settled - self.baseline
+        step_ns = self._step_ns
+        self.reset(settled)
+        if abs(difference) < self.min_step:
+            # Dérive lente ou bruit : nouvelle référence, rien à publier.
+            return None
+        return WeightEvent(settled, difference, step_ns, timestamp_ns)
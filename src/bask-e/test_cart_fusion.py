@@ -0,0 +1,53 @@
+import unittest
+from cart_fusion import CartFusion
+
+# Tests du moteur de fusion balance/caméra : python3 -m unittest test_cart_fusion
+
+SECOND = 10 ** 9
+
+
+class FakeCatalog:
+    def __init__(self, products):
+        self.products = products
+
+    def get_by_label(self, label):
+        return self.products.get(label)
+
+
+class LateWeightTest(unittest.TestCase):
+    def setUp(self):
+        catalog = FakeCatalog({'apple': {'id': 1, 'weight': 150}})
+        self.fusion = CartFusion(lambda: catalog, tolerance=20, join_window=1.0, stable_frames=2)
+
+    def push_apples(self, count, t):
+        return self.fusion.push_objects([{'label': 'apple', 'count': count}], arrival_ns=t)
+
+    def test_late_weight_accepts_rejected_composition(self):
+        self.fusion.push_weight({'weight': 0}, arrival_ns=0)
+        self.assertIsNone(self.push_apples(2, 1 * SECOND))
+        self.assertIsNone(self.push_apples(2, 2 * SECOND))
+
+        # Fenêtre dépassée sans poids cohérent : panier en erreur, une seule fois.
+        mutation = self.fusion.tick(3 * SECOND + 1)
+        self.assertTrue(mutation.cart_error)
+        self.assertIsNone(self.fusion.tick(4 * SECOND))
+        self.assertEqual(self.fusion.rejected, 1)
+
+        # La balance se stabilise après la fenêtre : la composition est acceptée.
+        mutation = self.fusion.push_weight({'weight': 305}, arrival_ns=5 * SECOND)
+        self.assertFalse(mutation.cart_error)
+        self.assertEqual([(product['id'], count) for product, count in mutation.items], [(1, 2)])
+        self.assertEqual(mutation.measured_weight, 305)
+        self.assertEqual(self.fusion.accepted, 1)
+
+    def test_inconsistent_late_weight_keeps_error(self):
+        self.fusion.push_weight({'weight': 0}, arrival_ns=0)
+        self.push_apples(1, 1 * SECOND)
+        self.push_apples(1, 2 * SECOND)
+        self.assertTrue(self.fusion.tick(3 * SECOND + 1).cart_error)
+        self.assertIsNone(self.fusion.push_weight({'weight': 400}, arrival_ns=4 * SECOND))
+        self.assertEqual((self.fusion.accepted, self.fusion.rejected), (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import threading
+from collections import deque
+
+# Politiques de file par topic
+LOSSLESS = 'lossless'  # aucun message perdu tant que le worker suit ; l'émetteur attend un temps borné
+CONFLATE = 'conflate'  # seul le dernier message compte ; les plus anciens sont remplacés
+
+LOSSLESS_QUEUE_SIZE = 64
+CONFLATE_QUEUE_SIZE = 1
+# Attente max (s) du thread réseau MQTT sur une file LOSSLESS pleine : au-delà
+# le message est écarté, plutôt que de bloquer les keep-alives et les autres topics.
+LOSSLESS_PUT_TIMEOUT = 0.5
+
+
+class TopicQueue:
+    """File bornée d'un topic, avec sa politique de débordement et ses compteurs."""
+
+    def __init__(self, policy=LOSSLESS, maxsize=None, put_timeout=LOSSLESS_PUT_TIMEOUT):
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.maxsize = maxsize or (CONFLATE_QUEUE_SIZE if policy == CONFLATE else LOSSLESS_QUEUE_SIZE)
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Compteurs
+        self.received = 0
+        self.handled = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item):
+        """Dépose un message ; retourne False s'il a été écarté (file LOSSLESS restée pleine)."""
+        with self._cond:
+            self.received += 1
+            if len(self._items) >= self.maxsize:
+                if self.policy == CONFLATE:
+                    self._items.popleft()
+                    self.dropped += 1
+                # Contre-pression bornée : le thread réseau MQTT attend le worker au plus put_timeout.
+                elif not self._cond.wait_for(lambda: len(self._items) < self.maxsize or self._closed,
+                                             self.put_timeout):
+                    self.dropped += 1
+                    return False
+            self._items.append(item)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self):
+        """Retourne le prochain message, ou None une fois la file fermée et vide."""
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def task_done(self):
+        with self._cond:
+            self.handled += 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'policy': self.policy,
+                'depth': len(self._items),
+                'max_depth': self.max_depth,
+                'received': self.received,
+                'handled': self.handled,
+                'dropped': self.dropped
+            }
+
+
+class TopicDispatcher:
+    """Répartit les messages MQTT sur une file et un thread worker par topic.
+
+    Le callback réseau de paho ne fait plus que déposer le payload brut dans
+    la file du topic ; décodage et traitement ont lieu dans le worker. Un
+    flot de messages sur un topic (caméra à 10 Hz) ne retarde donc plus les
+    messages des autres topics (paiement NFC).
+    """
+
+    def __init__(self, on_error=None):
+        self.on_error = on_error
+        self._queues = {}
+        self._handlers = {}
+        self._threads = []
+
+    def register(self, topic, handler, policy=LOSSLESS, maxsize=None):
+        """Associe `handler(payload)` au topic, avec la politique de file donnée."""
+        self._queues[topic] = TopicQueue(policy, maxsize)
+        self._handlers[topic] = handler
+
+    def start(self):
+        for topic, queue in self._queues.items():
+            thread = threading.Thread(target=self._work, args=(topic, queue),
+                                      name=f"dispatch-{topic}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Ferme les files ; les workers terminent les messages déjà reçus."""
+        for queue in self._queues.values():
+            queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def dispatch(self, topic, payload):
+        """Dépose un message ; retourne False si aucun handler n'est enregistré pour le topic.
+
+        Un message écarté faute de place est signalé à `on_error`.
+        """
+        queue = self._queues.get(topic)
+        if queue is None:
+            return False
+        if not queue.put(payload) and self.on_error is not None:
+            self.on_error(topic, OverflowError(f"file pleine depuis {queue.put_timeout} s, message écarté"))
+        return True
+
+    def _work(self, topic, queue):
+        handler = self._handlers[topic]
+        while True:
+            payload = queue.get()
+            if payload is None:
+                return
+            try:
+                handler(payload)
+            except Exception as e:
+                # Un message invalide ne doit pas arrêter le worker du topic.
+                if self.on_error is not None:
+                    self.on_error(topic, e)
+            queue.task_done()
+
+    def stats(self):
+        """Profondeur de file et compteurs (reçus, traités, écartés) par topic."""
+        return {topic: queue.stats() for topic, queue in self._queues.items()}
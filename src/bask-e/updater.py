@@ -1,4 +1,4 @@
-from requests import get, post
+from http_transport import transport
 from time import sleep
 from zlib import crc32
 from hashlib import sha256, sha384, sha512, md5
@@ -34,30 +34,30 @@ def collect_required_data():
 
 
 def get_auth_token():
-    response = post(f"https://{config['host']}/api/auth/login", 
-                   json={
-                       "username": config["username"],
-                       "password": config["password"]
-                   })
+    response = transport.post(f"https://{config['host']}/api/auth/login", 
+                              json={
+                                  "username": config["username"],
+                                  "password": config["password"]
+                              })
     return response.json().get("token")
 
 
 def send_online_status(auth_token):
     while True:
         headers = {"Authorization": f"Bearer {auth_token}"}
-        post(f"https://{config['host']}/api/v1/{config['token']}/telemetry",
-             headers=headers,
-             json={"status": "online"})
+        transport.post(f"https://{config['host']}/api/v1/{config['token']}/telemetry",
+                       headers=headers,
+                       json={"status": "online"})
         sleep(10)
 
 
 def send_telemetry(telemetry):
     print(f"Sending current info: {telemetry}")
-    post(f"https://{config['host']}/api/v1/{config['token']}/telemetry",json=telemetry)
+    transport.post(f"https://{config['host']}/api/v1/{config['token']}/telemetry",json=telemetry)
 
 
 def get_software_info():
-    response = get(f"https://{config['host']}/api/v1/{config['token']}/attributes", params={"sharedKeys": REQUIRED_SHARED_KEYS}).json()
+    response = transport.get(f"https://{config['host']}/api/v1/{config['token']}/attributes", params={"sharedKeys": REQUIRED_SHARED_KEYS}).json()
     return response.get("shared", {})
 
 
@@ -75,7 +75,7 @@ def get_software(sw_info):
         print(params)
         print(f'Getting chunk with number: {chunk_number + 1}. Chunk size is : {config["chunk_size"]} byte(s).')
         print(f"https://{config['host']}/api/v1/{config['token']}/software", params)
-        response = get(f"https://{config['host']}/api/v1/{config['token']}/software", params=params)
+        response = transport.get(f"https://{config['host']}/api/v1/{config['token']}/software", params=params)
         if response.status_code != 200:
             print("Received error:")
             response.raise_for_status()
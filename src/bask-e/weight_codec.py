@@ -0,0 +1,37 @@
+import json
+import struct
+import time
+
+# Format binaire des événements de poids (little-endian, 16 octets) :
+# int32 poids (g), int32 différence (g), uint64 horodatage time.monotonic_ns().
+WEIGHT_EVENT = struct.Struct('<iiQ')
+
+
+def encode_weight_event(weight, difference, timestamp_ns=None):
+    """Encode un événement de poids au format binaire compact."""
+    if timestamp_ns is None:
+        timestamp_ns = time.monotonic_ns()
+    return WEIGHT_EVENT.pack(round(weight), round(difference), timestamp_ns)
+
+
+def encode_weight_event_json(weight, difference):
+    """Encode un événement de poids au format JSON historique de scale/weight."""
+    return json.dumps({
+        'weight': weight,
+        'difference': difference,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    })
+
+
+def decode_weight_event(payload):
+    """Décode un événement de poids binaire ou JSON (détection automatique).
+
+    Un message binaire fait exactement WEIGHT_EVENT.size octets, bien moins
+    que le plus court message JSON. Retourne un dict au format JSON ; pour le
+    binaire 'timestamp' vaut None et 'timestamp_ns' porte l'horodatage
+    monotone de la balance.
+    """
+    if len(payload) == WEIGHT_EVENT.size:
+        weight, difference, timestamp_ns = WEIGHT_EVENT.unpack(payload)
+        return {'weight': weight, 'difference': difference, 'timestamp': None, 'timestamp_ns': timestamp_ns}
+    return json.loads(payload)
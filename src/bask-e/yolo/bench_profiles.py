@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import time
+from collections import Counter
+import cv2
+import numpy as np
+from detector import BACKENDS, DEFAULT_BACKEND, MODEL_PATHS, PROFILES, Detector
+
+# --------------------- Configuration ---------------------
+
+REFERENCE_PROFILE = 'full-640'
+LABELS_OF_INTEREST = ['bottle', 'toothbrush', 'banana', 'apple']
+WARMUP = 3
+
+# --------------------- Benchmark ---------------------
+
+def load_frames(directory):
+    """Charge les images enregistrées d'un dossier, triées par nom."""
+    frames = {}
+    for name in sorted(os.listdir(directory)):
+        frame = cv2.imread(os.path.join(directory, name))
+        if frame is not None:
+            frames[name] = frame
+    return frames
+
+def count_labels(detections):
+    return Counter(d['label'] for d in detections if d['label'] in LABELS_OF_INTEREST)
+
+def recall(expected, found):
+    """Part des objets attendus retrouvés (comptage par label, plafonné à l'attendu)."""
+    total = sum(expected.values())
+    if not total:
+        return None
+    return sum(min(found[label], count) for label, count in expected.items()) / total
+
+def run(detector, frames, expected):
+    """Mesure la latence par image (ms) et le rappel moyen du profil courant."""
+    first = next(iter(frames.values()))
+    for _ in range(WARMUP):
+        detector.detect(first)
+
+    latencies, recalls = [], []
+    for name, frame in frames.items():
+        start = time.perf_counter()
+        detections = detector.detect(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+        r = recall(expected[name], count_labels(detections))
+        if r is not None:
+            recalls.append(r)
+    return latencies, recalls
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence et rappel des profils de détection sur des images enregistrées.")
+    parser.add_argument("frames", help="dossier d'images enregistrées")
+    parser.add_argument("--labels", help="vérité terrain JSON {image: {label: nombre}} ; "
+                                         f"à défaut, le profil {REFERENCE_PROFILE} sert de référence")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=list(BACKENDS))
+    parser.add_argument("--weights", help="modèle du moteur (défaut : detector.MODEL_PATHS)")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    if not frames:
+        print("Aucune image trouvée.")
+        return
+    detector = Detector(args.weights or MODEL_PATHS[args.backend], allowed=LABELS_OF_INTEREST, backend=args.backend)
+
+    if args.labels:
+        with open(args.labels) as f:
+            expected = {name: Counter(counts) for name, counts in json.load(f).items()}
+    else:
+        detector.profile = PROFILES[REFERENCE_PROFILE]
+        expected = {name: count_labels(detector.detect(frame)) for name, frame in frames.items()}
+    frames = {name: frame for name, frame in frames.items() if name in expected}
+
+    print(f"{'profil':<15} {'moy. (ms)':>10} {'p95 (ms)':>10} {'rappel':>8}")
+    for name in args.profiles:
+        detector.profile = PROFILES[name]
+        latencies, recalls = run(detector, frames, expected)
+        mean_recall = f"{np.mean(recalls):.3f}" if recalls else "-"
+        print(f"{name:<15} {np.mean(latencies):>10.1f} {np.percentile(latencies, 95):>10.1f} {mean_recall:>8}")
+
+if __name__ == '__main__':
+    main()
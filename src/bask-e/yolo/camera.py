@@ -0,0 +1,123 @@
+import threading
+import time
+import cv2
+
+# ---------------- Configuration par défaut ----------------
+
+WARMUP_FRAMES = 10  # Images ignorées après ouverture (réglage de l'exposition)
+FRAME_TIMEOUT = 2.0  # Attente max (s) d'une image dans get_frame()
+FIRST_REOPEN_DELAY = 1  # secondes
+MAX_REOPEN_DELAY = 30  # secondes
+
+
+class CameraManager:
+    """Session caméra longue durée : la pipeline reste ouverte et chaude.
+
+    Un thread lit la caméra en continu et garde la dernière image. Les
+    `warmup_frames` premières images après chaque ouverture sont ignorées,
+    le temps que l'exposition automatique se règle. En cas d'échec
+    (ouverture ou lecture), la pipeline est relâchée puis rouverte avec une
+    attente croissante. get_frame() rend immédiatement une image déjà
+    exposée au lieu d'ouvrir nvarguscamerasrc à chaque demande.
+    """
+
+    def __init__(self, pipeline, api=cv2.CAP_GSTREAMER, warmup_frames=WARMUP_FRAMES, opener=None):
+        self.pipeline = pipeline
+        self.api = api
+        # Ouverture de la source ; remplaçable par une source enregistrée (voir replay)
+        self.opener = opener or (lambda: cv2.VideoCapture(self.pipeline, self.api))
+        self.warmup_frames = warmup_frames
+        self._cond = threading.Condition()
+        self._frame = None
+        self._stamp = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Compteurs
+        self.opens = 0
+        self.failures = 0
+        self.frames = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="camera", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_frame(self, after=None, timeout=FRAME_TIMEOUT):
+        """Retourne la dernière image, capturée après l'instant monotone `after` si donné.
+
+        Retourne None si aucune image convenable n'arrive avant `timeout`.
+        """
+        latest = self._next(after, timeout)
+        return None if latest is None else latest[0]
+
+    def get_frames(self, count, after=None, timeout=FRAME_TIMEOUT):
+        """Retourne `count` images successives distinctes capturées après `after`.
+
+        Retourne None si elles ne sont pas toutes arrivées avant `timeout`.
+        """
+        deadline = time.monotonic() + timeout
+        frames = []
+        while len(frames) < count:
+            latest = self._next(after, deadline - time.monotonic())
+            if latest is None:
+                return None
+            frame, after = latest
+            frames.append(frame)
+        return frames
+
+    def _next(self, after, timeout):
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._frame is not None and (after is None or self._stamp > after),
+                max(0.0, timeout))
+            return (self._frame, self._stamp) if ready else None
+
+    def _run(self):
+        delay = FIRST_REOPEN_DELAY
+        while not self._stop.is_set():
+            cap = self.opener()
+            if not cap.isOpened():
+                print(f"Impossible d'ouvrir la caméra, nouvel essai dans {delay} s.")
+                self.failures += 1
+                cap.release()
+                self._stop.wait(delay)
+                delay = min(delay * 2, MAX_REOPEN_DELAY)
+                continue
+
+            self.opens += 1
+            warmup = self.warmup_frames
+            try:
+                while not self._stop.is_set():
+                    ret, frame = cap.read()
+                    if not ret:
+                        print("Erreur de lecture vidéo, réouverture de la caméra.")
+                        self.failures += 1
+                        break
+                    if warmup > 0:
+                        warmup -= 1
+                        continue
+                    delay = FIRST_REOPEN_DELAY
+                    with self._cond:
+                        self._frame = frame
+                        self._stamp = time.monotonic()
+                        self.frames += 1
+                        self._cond.notify_all()
+            finally:
+                cap.release()
+            # Ne pas rendre une image d'avant la panne comme image courante.
+            with self._cond:
+                self._frame = None
+            self._stop.wait(delay)
+            delay = min(delay * 2, MAX_REOPEN_DELAY)
+
+    def stats(self):
+        return {'opens': self.opens, 'failures': self.failures, 'frames': self.frames}
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# ---------------- Configuration par défaut ----------------
+
+SNAPSHOT_INTERVAL = 5.0  # secondes min entre deux écritures de l'instantané
+
+
+class CountState:
+    """Comptages par label gardés en mémoire et persistés en arrière-plan.
+
+    update() ne fait que remplacer l'état en mémoire : aucune écriture sur
+    la carte SD dans le chemin de détection. Un thread écrit l'instantané au
+    plus une fois par `interval` (les mises à jour rapprochées sont
+    regroupées) dans un fichier temporaire renommé ensuite par
+    os.replace() : le fichier `path` est toujours complet, même après une
+    coupure. Si `journal_path` est donné, chaque changement y est aussi
+    ajouté en une ligne compacte ({"t": horodatage, "c": labels modifiés}).
+    """
+
+    def __init__(self, path, interval=SNAPSHOT_INTERVAL, journal_path=None):
+        self.path = path
+        self.interval = interval
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._journal = []  # Lignes en attente d'écriture
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Compteurs
+        self.updates = 0
+        self.snapshots = 0
+        self.journal_lines = 0
+        self.errors = 0
+
+    def load(self):
+        """Charge le dernier instantané ; retourne les comptages."""
+        try:
+            with open(self.path, "r") as f:
+                counts = Counter(json.load(f))
+            print("Résultats précédents chargés depuis le fichier.")
+        except FileNotFoundError:
+            print("Fichier de résultats précédents non trouvé. Initialisation vide.")
+            counts = Counter()
+        except json.JSONDecodeError as e:
+            print(f"Erreur de lecture du fichier JSON : {e}. Réinitialisation des résultats.")
+            counts = Counter()
+        with self._lock:
+            self._counts = counts
+        return Counter(counts)
+
+    def get(self):
+        with self._lock:
+            return Counter(self._counts)
+
+    def update(self, counts):
+        """Remplace les comptages courants ; l'écriture est différée."""
+        counts = Counter({label: count for label, count in counts.items() if count})
+        with self._lock:
+            if counts == self._counts:
+                return
+            if self.journal_path:
+                changed = {label: counts[label] for label in set(counts) | set(self._counts)
+                           if counts[label] != self._counts[label]}
+                self._journal.append(json.dumps({"t": round(time.time(), 3), "c": changed},
+                                                separators=(',', ':')))
+            self._counts = counts
+            self.updates += 1
+        self._dirty.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="count-state", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le thread après une dernière écriture des changements en attente."""
+        self._stop.set()
+        self._dirty.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Écrit immédiatement l'instantané et le journal s'ils ont changé."""
+        if not self._dirty.is_set():
+            return
+        self._dirty.clear()
+        with self._lock:
+            counts = dict(self._counts)
+            lines, self._journal = self._journal, []
+        try:
+            if lines:
+                with open(self.journal_path, "a") as f:
+                    f.write("\n".join(lines) + "\n")
+                self.journal_lines += len(lines)
+                lines = []
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(counts, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.snapshots += 1
+        except OSError as e:
+            print(f"Erreur lors de la sauvegarde des résultats : {e}")
+            self.errors += 1
+            if lines:
+                # Lignes non écrites remises en tête, avant celles arrivées entre-temps.
+                with self._lock:
+                    self._journal = lines + self._journal
+            self._dirty.set()  # Nouvel essai à la prochaine écriture
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._dirty.wait()
+            if self._stop.is_set():
+                break
+            self.flush()
+            # Les mises à jour arrivées pendant l'attente partiront ensemble.
+            self._stop.wait(self.interval)
+
+    def stats(self):
+        return {'updates': self.updates, 'snapshots': self.snapshots,
+                'journal_lines': self.journal_lines, 'errors': self.errors}
@@ -0,0 +1,328 @@
+import json
+from collections import Counter, defaultdict
+import cv2
+import numpy as np
+import torch
+import torchvision
+
+# ---------------- Configuration par défaut ----------------
+
+INPUT_SIZE = 320  # Plus grand côté de l'entrée du réseau (comme OBJ_DETECTION)
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 300  # Détections max par image après NMS
+STRIDE = 32  # Les dimensions d'entrée doivent être multiples du pas du réseau
+PAD_COLOR = 114
+TILE_OVERLAP = 0.2  # Recouvrement relatif entre tuiles voisines
+
+# Zone du panier dans l'image, en fractions (x, y, largeur, hauteur)
+BASKET_ROI = (0.1, 0.0, 0.8, 1.0)
+
+# Modèle utilisé par chaque moteur d'inférence (les .onnx sont produits par export_onnx.py)
+MODEL_PATHS = {
+    'torch': '/opt/bask-e/yolo/weights/yolov5s.pt',
+    'onnx': '/opt/bask-e/yolo/weights/yolov5s.onnx',
+    'onnx-int8': '/opt/bask-e/yolo/weights/yolov5s-int8.onnx',
+}
+DEFAULT_BACKEND = 'torch'
+
+
+def letterbox(image, size, stride=STRIDE):
+    """Redimensionne sans déformer (plus grand côté = `size`) puis complète au multiple de `stride`.
+
+    Retourne (image, échelle, (décalage x, décalage y)).
+    """
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    new_width, new_height = round(width * scale), round(height * scale)
+    pad_x, pad_y = -new_width % stride, -new_height % stride
+    left, top = pad_x // 2, pad_y // 2
+    resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    padded = cv2.copyMakeBorder(resized, top, pad_y - top, left, pad_x - left,
+                                cv2.BORDER_CONSTANT, value=(PAD_COLOR,) * 3)
+    return padded, scale, (left, top)
+
+
+class DetectionProfile:
+    """Prétraitement appliqué avant le réseau : zone d'intérêt, taille d'entrée, tuiles.
+
+    `roi` restreint la détection à une zone fixe (fractions de l'image) ;
+    `tiles` (colonnes, lignes) découpe cette zone en tuiles qui se
+    recouvrent, chacune passée au réseau à `input_size` : les petits
+    articles y gardent plus de pixels.
+    """
+
+    def __init__(self, input_size=INPUT_SIZE, roi=None, tiles=(1, 1), overlap=TILE_OVERLAP):
+        self.input_size = input_size
+        self.roi = roi
+        self.tiles = tiles
+        self.overlap = overlap
+
+    def regions(self, frame_shape):
+        """Régions (x0, y0, x1, y1) de l'image à soumettre au réseau."""
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = 0, 0, width, height
+        if self.roi is not None:
+            rx, ry, rw, rh = self.roi
+            x0, y0 = int(rx * width), int(ry * height)
+            x1, y1 = min(width, int((rx + rw) * width)), min(height, int((ry + rh) * height))
+
+        columns, rows = self.tiles
+        tile_w = (x1 - x0) / (columns - (columns - 1) * self.overlap)
+        tile_h = (y1 - y0) / (rows - (rows - 1) * self.overlap)
+        return [
+            (int(x0 + c * tile_w * (1 - self.overlap)), int(y0 + r * tile_h * (1 - self.overlap)),
+             min(x1, int(x0 + c * tile_w * (1 - self.overlap) + tile_w)),
+             min(y1, int(y0 + r * tile_h * (1 - self.overlap) + tile_h)))
+            for r in range(rows) for c in range(columns)
+        ]
+
+
+# Profils de détection prédéfinis
+PROFILES = {
+    'full-320': DetectionProfile(320),
+    'full-640': DetectionProfile(640),
+    'roi-320': DetectionProfile(320, BASKET_ROI),
+    'roi-416': DetectionProfile(416, BASKET_ROI),
+    'roi-640': DetectionProfile(640, BASKET_ROI),
+    'roi-tiled-320': DetectionProfile(320, BASKET_ROI, tiles=(2, 2)),
+}
+DEFAULT_PROFILE = 'full-320'
+
+
+class TorchBackend:
+    """Poids yolov5 PyTorch (fp32), chargés par OBJ_DETECTION."""
+
+    input_shape = None  # Accepte toute taille multiple de STRIDE
+
+    def __init__(self, model_path, classes=None):
+        # Importé ici : le module reste utilisable sans le dépôt yolov5 (replay, bancs, ONNX)
+        from elements.yolo import OBJ_DETECTION
+        self.model = OBJ_DETECTION(model_path, classes).yolo_model
+        self.device = next(self.model.parameters()).device
+        # Noms de classes enregistrés dans les poids yolov5
+        names = self.model.names
+        self.names = list(names.values()) if isinstance(names, dict) else list(names)
+
+    def __call__(self, batch):
+        """Sortie brute (B, N, 5 + classes) pour un lot uint8 (B, 3, H, W) RGB."""
+        tensor = torch.from_numpy(batch).to(self.device).float() / 255.0
+        with torch.no_grad():
+            return self.model(tensor, augment=False)[0]
+
+
+class OnnxBackend:
+    """Modèle exporté par export_onnx.py (fp32 ou int8), exécuté par ONNX Runtime sur CPU.
+
+    L'export fixe la taille d'entrée : les lots sont complétés à
+    `input_shape` par Detector.preprocess().
+    """
+
+    def __init__(self, model_path, classes=None):
+        import onnxruntime
+        self.session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        height, width = model_input.shape[2:]
+        self.input_shape = (height, width) if isinstance(height, int) and isinstance(width, int) else None
+        self.device = torch.device('cpu')
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = json.loads(metadata['names']) if 'names' in metadata else None
+
+    def __call__(self, batch):
+        pred = self.session.run(None, {self.input_name: batch.astype(np.float32) / 255.0})[0]
+        return torch.from_numpy(pred)
+
+
+BACKENDS = {
+    'torch': TorchBackend,
+    'onnx': OnnxBackend,
+    'onnx-int8': OnnxBackend,
+}
+
+
+class Detector:
+    """Détecteur YOLO avec inférence par lots, profils et choix du moteur.
+
+    `backend` (voir BACKENDS) choisit le moteur qui exécute le réseau :
+    PyTorch fp32 via OBJ_DETECTION, ou ONNX Runtime avec un modèle fp32
+    ou int8. Prétraitement et post-traitement sont communs à tous les
+    moteurs. detect() garde le format de sortie habituel ({'label',
+    'bbox', 'score'}) et detect_batch() passe toutes les régions de N
+    images dans un seul lot. Les boîtes sont ramenées en coordonnées de
+    l'image d'origine.
+
+    `allowed` restreint les classes dès la sortie brute du réseau, avant
+    la NMS et la construction des dictionnaires : leur coût suit le nombre
+    d'articles vendus et non l'encombrement de la scène.
+    `class_thresholds` ({label: (confiance, IoU)}) remplace les seuils
+    par défaut pour certaines classes.
+    """
+
+    def __init__(self, model_path, classes=None, profile=DEFAULT_PROFILE,
+                 conf_threshold=CONF_THRESHOLD, iou_threshold=IOU_THRESHOLD,
+                 allowed=None, class_thresholds=None, backend=DEFAULT_BACKEND):
+        self.backend = BACKENDS[backend](model_path, classes)
+        self.device = self.backend.device
+        self.classes = classes or self.backend.names
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.set_classes(allowed, class_thresholds)
+
+    def set_classes(self, allowed=None, class_thresholds=None):
+        """Définit les classes retenues et leurs seuils (confiance, IoU)."""
+        class_thresholds = class_thresholds or {}
+        indices = range(len(self.classes)) if allowed is None else \
+            sorted(self.classes.index(label) for label in allowed)
+        # Colonnes des classes retenues dans la sortie du réseau (après x, y, w, h, objectness)
+        self._class_ids = torch.tensor(list(indices), dtype=torch.long, device=self.device)
+        self._columns = self._class_ids + 5
+        thresholds = [class_thresholds.get(self.classes[i], (self.conf_threshold, self.iou_threshold))
+                      for i in indices]
+        self._conf = torch.tensor([conf for conf, _ in thresholds], device=self.device)
+        # Classes regroupées par seuil IoU : une NMS par groupe
+        groups = defaultdict(list)
+        for position, (_, iou) in enumerate(thresholds):
+            groups[iou].append(position)
+        self._iou_groups = [(iou, torch.tensor(positions, device=self.device)) for iou, positions in groups.items()]
+        self._min_conf = min(conf for conf, _ in thresholds) if thresholds else 1.0
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def preprocess(self, frames):
+        """Découpe, redimensionne et empile les régions ; retourne (lot uint8 RGB, origines).
+
+        Chaque origine (index d'image, échelle, décalage x, décalage y)
+        permet de ramener les boîtes d'une région dans son image.
+        """
+        images, origins = [], []
+        for index, frame in enumerate(frames):
+            for x0, y0, x1, y1 in self.profile.regions(frame.shape):
+                image, scale, (left, top) = letterbox(frame[y0:y1, x0:x1], self.profile.input_size)
+                images.append(image)
+                origins.append((index, scale, x0 - left / scale, y0 - top / scale))
+
+        # Régions de tailles voisines : complétées en bas/à droite à la taille commune,
+        # ou à la taille fixée par le moteur.
+        height = max(image.shape[0] for image in images)
+        width = max(image.shape[1] for image in images)
+        if self.backend.input_shape is not None:
+            if height > self.backend.input_shape[0] or width > self.backend.input_shape[1]:
+                raise ValueError(f"Régions {height}x{width} plus grandes que l'entrée du modèle "
+                                 f"{self.backend.input_shape[0]}x{self.backend.input_shape[1]}")
+            height, width = self.backend.input_shape
+        batch = np.stack([
+            cv2.copyMakeBorder(image, 0, height - image.shape[0], 0, width - image.shape[1],
+                               cv2.BORDER_CONSTANT, value=(PAD_COLOR,) * 3)
+            for image in images
+        ])[..., ::-1]  # BGR -> RGB
+        return np.ascontiguousarray(batch.transpose(0, 3, 1, 2)), origins
+
+    def detect_batch(self, frames):
+        """Détecte les objets sur une liste d'images ; retourne une liste de détections par image."""
+        if not frames:
+            return []
+        batch, origins = self.preprocess(frames)
+        pred = self.backend(batch)
+        with torch.no_grad():
+            pred = [self.postprocess(p) for p in pred]
+
+        # Regroupement des régions par image, en coordonnées de l'image
+        per_frame = [[] for _ in frames]
+        for p, (index, scale, offset_x, offset_y) in zip(pred, origins):
+            if p is None or not len(p):
+                continue
+            p = p.clone()
+            p[:, [0, 2]] = p[:, [0, 2]] / scale + offset_x
+            p[:, [1, 3]] = p[:, [1, 3]] / scale + offset_y
+            per_frame[index].append(p)
+
+        return [self._items(self._merge(p)) for p in per_frame]
+
+    def postprocess(self, pred):
+        """Filtre la sortie brute d'une région (N, 5 + classes) : classes retenues, seuils, NMS.
+
+        Retourne un tenseur (M, 6) : x1, y1, x2, y2, confiance, position de
+        la classe dans les classes retenues.
+        """
+        pred = pred[pred[:, 4] > self._min_conf]
+        if not len(pred):
+            return None
+        scores = pred[:, self._columns] * pred[:, 4:5]
+        conf, position = scores.max(1)
+        keep = conf > self._conf[position]
+        if not keep.any():
+            return None
+        pred, conf, position = pred[keep], conf[keep], position[keep]
+
+        boxes = torch.empty_like(pred[:, :4])
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+        return self._nms(torch.cat((boxes, conf[:, None], position[:, None].float()), 1))
+
+    def _nms(self, det):
+        """NMS par classe, avec le seuil IoU propre à chaque classe."""
+        kept = []
+        for iou, positions in self._iou_groups:
+            group = det[(det[:, 5:6] == positions.float()).any(1)]
+            if len(group):
+                kept.append(group[torchvision.ops.batched_nms(group[:, :4], group[:, 4], group[:, 5], iou)])
+        if not kept:
+            return None
+        det = torch.cat(kept)
+        return det[det[:, 4].argsort(descending=True)[:MAX_DETECTIONS]]
+
+    def _merge(self, preds):
+        """Fusionne les détections des tuiles d'une image (NMS par classe entre tuiles)."""
+        if not preds:
+            return None
+        if len(preds) == 1:
+            return preds[0]
+        return self._nms(torch.cat(preds))
+
+    def _items(self, pred):
+        items = []
+        if pred is None:
+            return items
+        class_ids = self._class_ids.cpu().numpy()
+        for xmin, ymin, xmax, ymax, score, position in pred.cpu().numpy():
+            items.append({
+                'label': self.classes[class_ids[int(position)]],
+                'bbox': [(int(xmin), int(ymin)), (int(xmax), int(ymax))],
+                'score': np.round(score, 2)
+            })
+        return items
+
+
+def vote_counts(frames_detections, labels):
+    """Fusionne les comptages par label de plusieurs images par vote majoritaire.
+
+    Pour chaque label, chaque image vote pour le nombre d'objets qu'elle y
+    voit (0 si absent) ; le nombre le plus voté l'emporte. En cas
+    d'égalité, le nombre dont les détections ont la confiance cumulée la
+    plus élevée est retenu. Une fausse détection isolée sur une image est
+    ainsi écartée.
+    """
+    votes = {label: Counter() for label in labels}
+    confidence = {label: defaultdict(float) for label in labels}
+    for detections in frames_detections:
+        counts = Counter()
+        scores = defaultdict(float)
+        for detection in detections:
+            if detection['label'] in votes:
+                counts[detection['label']] += 1
+                scores[detection['label']] += float(detection['score'])
+        for label in labels:
+            votes[label][counts[label]] += 1
+            confidence[label][counts[label]] += scores[label]
+
+    label_counts = Counter()
+    for label in labels:
+        if not votes[label]:
+            continue
+        count = max(votes[label], key=lambda c: (votes[label][c], confidence[label][c]))
+        if count:
+            label_counts[label] = count
+    return label_counts
@@ -0,0 +1,184 @@
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+from collections import Counter
+import numpy as np
+import torch
+from bench_profiles import load_frames
+from detector import DEFAULT_PROFILE, MODEL_PATHS, PROFILES, Detector
+
+# Exporte les poids yolov5 en ONNX (fp32 puis int8) et vérifie, sur des
+# images enregistrées, que les modèles exportés détectent comme PyTorch.
+
+# --------------------- Configuration ---------------------
+
+LABELS_OF_INTEREST = ['bottle', 'toothbrush', 'banana', 'apple']
+OPSET = 13  # 13 min. pour la quantification int8 par canal
+MATCH_IOU = 0.5  # IoU min pour apparier une détection à celle de référence
+MIN_AGREEMENT = 0.95  # Part min d'images aux comptages identiques à la référence
+WARMUP = 3
+
+# --------------------- Export ---------------------
+
+class RawOutput(torch.nn.Module):
+    """Modèle yolov5 réduit à sa sortie brute décodée (B, N, 5 + classes)."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, images):
+        return self.model(images, augment=False)[0]
+
+def export_fp32(reference, input_shape, path, opset=OPSET):
+    """Exporte le modèle PyTorch de `reference` à la taille d'entrée fixe `input_shape` (lot variable)."""
+    import onnx
+    height, width = input_shape
+    model = RawOutput(reference.backend.model).eval()
+    images = torch.zeros(1, 3, height, width, device=reference.device)
+    # Exporteur par traçage (celui des versions de PyTorch du Nano), même sur PyTorch 2.x
+    options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(model, images, path, opset_version=opset,
+                          input_names=['images'], output_names=['output'],
+                          dynamic_axes={'images': {0: 'batch'}, 'output': {0: 'batch'}}, **options)
+
+    # Noms des classes gardés dans le modèle (lus par detector.OnnxBackend)
+    exported = onnx.load(path)
+    onnx.helper.set_model_props(exported, {'names': json.dumps(reference.classes)})
+    onnx.save(exported, path)
+
+class CalibrationFrames:
+    """Lots d'images prétraitées pour calibrer la quantification statique."""
+
+    def __init__(self, reference, frames, input_name='images'):
+        # Prétraitées ensemble : toutes les régions ont la taille de l'export
+        batch = reference.preprocess(list(frames))[0].astype(np.float32) / 255.0
+        self._inputs = iter([{input_name: batch[i:i + 1]} for i in range(len(batch))])
+
+    def get_next(self):
+        return next(self._inputs, None)
+
+def quantize_int8(fp32_path, int8_path, reference, frames, dynamic=False):
+    """Quantifie les convolutions en int8.
+
+    Par défaut, la quantification est statique, calibrée sur les images
+    enregistrées. `dynamic` ne quantifie que les poids, sans calibration.
+    Le décodage des boîtes reste en fp32 : la sortie mêle des coordonnées
+    en pixels et des probabilités, qu'une échelle int8 commune écraserait.
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    if dynamic:
+        quantize_dynamic(fp32_path, int8_path, op_types_to_quantize=['Conv'], weight_type=QuantType.QUInt8)
+    else:
+        quantize_static(fp32_path, int8_path, CalibrationFrames(reference, frames),
+                        quant_format=QuantFormat.QDQ, op_types_to_quantize=['Conv'], per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+# --------------------- Validation ---------------------
+
+def box_iou(a, b):
+    (ax0, ay0), (ax1, ay1) = a
+    (bx0, by0), (bx1, by1) = b
+    inter = max(0, min(ax1, bx1) - max(ax0, bx0)) * max(0, min(ay1, by1) - max(ay0, by0))
+    union = (ax1 - ax0) * (ay1 - ay0) + (bx1 - bx0) * (by1 - by0) - inter
+    return inter / union if union > 0 else 0.0
+
+def match(expected, found):
+    """Apparie les détections de même label (IoU décroissante) ; retourne [(IoU, écart de score)]."""
+    pairs = sorted(((box_iou(e['bbox'], f['bbox']), i, j) for i, e in enumerate(expected)
+                    for j, f in enumerate(found) if e['label'] == f['label']), reverse=True)
+    used_e, used_f, matches = set(), set(), []
+    for iou, i, j in pairs:
+        if iou < MATCH_IOU or i in used_e or j in used_f:
+            continue
+        used_e.add(i)
+        used_f.add(j)
+        matches.append((iou, abs(float(expected[i]['score']) - float(found[j]['score']))))
+    return matches
+
+def timed_detections(detector, frames):
+    """Détections et latences (ms) image par image."""
+    first = next(iter(frames.values()))
+    for _ in range(WARMUP):
+        detector.detect(first)
+    detections, latencies = {}, []
+    for name, frame in frames.items():
+        start = time.perf_counter()
+        detections[name] = detector.detect(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return detections, latencies
+
+def compare(reference, candidate):
+    """Parité d'un moteur avec la référence : comptages, rappel, précision, IoU et écart de score."""
+    same_counts = sum(Counter(d['label'] for d in reference[name]) == Counter(d['label'] for d in found)
+                      for name, found in candidate.items())
+    expected = sum(len(d) for d in reference.values())
+    total = sum(len(d) for d in candidate.values())
+    matches = [m for name, found in candidate.items() for m in match(reference[name], found)]
+    return {
+        'agreement': same_counts / len(candidate),
+        'recall': len(matches) / expected if expected else 1.0,
+        'precision': len(matches) / total if total else 1.0,
+        'iou': np.mean([iou for iou, _ in matches]) if matches else None,
+        'score_diff': np.mean([diff for _, diff in matches]) if matches else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ONNX fp32/int8 des poids yolov5 et vérification de parité.")
+    parser.add_argument("frames", help="dossier d'images enregistrées (calibration et validation)")
+    parser.add_argument("--weights", default=MODEL_PATHS['torch'])
+    parser.add_argument("--onnx", default=MODEL_PATHS['onnx'])
+    parser.add_argument("--onnx-int8", default=MODEL_PATHS['onnx-int8'])
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=list(PROFILES),
+                        help="profil de détection dont la taille d'entrée est figée dans l'export")
+    parser.add_argument("--dynamic", action="store_true", help="quantification dynamique (sans calibration)")
+    parser.add_argument("--opset", type=int, default=OPSET)
+    parser.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT)
+    parser.add_argument("--validate-only", action="store_true", help="vérifie des modèles déjà exportés")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    if not frames:
+        print("Aucune image trouvée.")
+        return
+    reference = Detector(args.weights, profile=args.profile, allowed=LABELS_OF_INTEREST)
+
+    if not args.validate_only:
+        # Taille d'entrée des lots de ce profil pour les images de la caméra
+        input_shape = reference.preprocess(list(frames.values()))[0].shape[2:]
+        for path in (args.onnx, args.onnx_int8):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        print(f"Export ONNX {input_shape[0]}x{input_shape[1]} : {args.onnx}")
+        export_fp32(reference, input_shape, args.onnx, args.opset)
+        print(f"Quantification int8 ({'dynamique' if args.dynamic else 'statique'}) : {args.onnx_int8}")
+        quantize_int8(args.onnx, args.onnx_int8, reference, frames.values(), args.dynamic)
+
+    expected, latencies = timed_detections(reference, frames)
+    print(f"{'moteur':<10} {'moy. (ms)':>10} {'p95 (ms)':>10} {'comptages':>10} {'rappel':>8} "
+          f"{'précision':>10} {'IoU':>6} {'Δscore':>7}")
+    print(f"{'torch':<10} {np.mean(latencies):>10.1f} {np.percentile(latencies, 95):>10.1f}")
+
+    failed = []
+    for backend, path in (('onnx', args.onnx), ('onnx-int8', args.onnx_int8)):
+        candidate = Detector(path, reference.classes, args.profile, allowed=LABELS_OF_INTEREST, backend=backend)
+        detections, latencies = timed_detections(candidate, frames)
+        parity = compare(expected, detections)
+        iou = f"{parity['iou']:.3f}" if parity['iou'] is not None else "-"
+        score_diff = f"{parity['score_diff']:.3f}" if parity['score_diff'] is not None else "-"
+        print(f"{backend:<10} {np.mean(latencies):>10.1f} {np.percentile(latencies, 95):>10.1f} "
+              f"{parity['agreement']:>10.3f} {parity['recall']:>8.3f} {parity['precision']:>10.3f} "
+              f"{iou:>6} {score_diff:>7}")
+        if parity['agreement'] < args.min_agreement:
+            failed.append(backend)
+
+    if failed:
+        print(f"Parité insuffisante (comptages < {args.min_agreement}) : {', '.join(failed)}")
+        sys.exit(1)
+    print("Parité vérifiée : les modèles ONNX peuvent être sélectionnés par DETECTOR_BACKEND.")
+
+if __name__ == '__main__':
+    main()
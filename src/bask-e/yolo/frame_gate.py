@@ -0,0 +1,98 @@
+import time
+import cv2
+import numpy as np
+
+# ---------------- Configuration par défaut ----------------
+
+THUMBNAIL_SIZE = (64, 36)  # Vignette (largeur, hauteur) comparée d'une image à l'autre
+PIXEL_THRESHOLD = 12  # Écart de niveau de gris à partir duquel un pixel a changé
+CHANGED_RATIO = 0.01  # Part de pixels modifiés qui déclenche l'inférence
+SETTLE_FRAMES = 3  # Inférences supplémentaires après le dernier mouvement
+REFRESH_INTERVAL = 5.0  # Inférence forcée au moins toutes les N secondes
+
+
+class FrameGate:
+    """Décide si une image justifie une inférence YOLO complète.
+
+    Chaque image est réduite en vignette grise floutée et comparée à la
+    vignette de la dernière image inférée. Si assez de pixels ont changé,
+    l'image est inférée, ainsi que les `settle_frames` suivantes pour
+    observer la scène une fois le mouvement terminé. Une inférence est
+    forcée toutes les `refresh_interval` secondes (dérive d'éclairage).
+    Un panier immobile ne coûte donc presque plus d'inférence.
+    """
+
+    def __init__(self, size=THUMBNAIL_SIZE, pixel_threshold=PIXEL_THRESHOLD, changed_ratio=CHANGED_RATIO,
+                 settle_frames=SETTLE_FRAMES, refresh_interval=REFRESH_INTERVAL):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.changed_ratio = changed_ratio
+        self.settle_frames = settle_frames
+        self.refresh_interval = refresh_interval
+        self._reference = None
+        self._remaining = 0
+        self._last_inference = 0.0
+
+        # Compteurs
+        self.frames = 0
+        self.inferred = 0
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    def should_infer(self, frame):
+        """Retourne True si l'image doit passer par le détecteur."""
+        self.frames += 1
+        thumb = self.thumbnail(frame)
+        now = time.monotonic()
+
+        if self._reference is None:
+            changed = True
+        else:
+            diff = cv2.absdiff(thumb, self._reference)
+            changed = np.count_nonzero(diff > self.pixel_threshold) >= self.changed_ratio * diff.size
+
+        if changed:
+            self._remaining = self.settle_frames
+        elif self._remaining > 0:
+            self._remaining -= 1
+        elif now - self._last_inference < self.refresh_interval:
+            return False
+
+        self._reference = thumb
+        self._last_inference = now
+        self.inferred += 1
+        return True
+
+    def stats(self):
+        return {'frames': self.frames, 'inferred': self.inferred, 'skipped': self.frames - self.inferred}
+
+
+class StableCounts:
+    """Ne laisse passer un comptage de labels que s'il a changé et s'est stabilisé.
+
+    Un comptage n'est publié qu'après `stable_frames` inférences consécutives
+    identiques, et seulement s'il diffère du dernier publié : un panier
+    immobile ne génère aucun trafic MQTT.
+    """
+
+    def __init__(self, stable_frames=SETTLE_FRAMES):
+        self.stable_frames = stable_frames
+        self.published = None
+        self._candidate = None
+        self._streak = 0
+
+    def update(self, label_counts):
+        """Retourne le comptage à publier, ou None."""
+        counts = dict(label_counts)
+        if counts == self._candidate:
+            self._streak += 1
+        else:
+            self._candidate = counts
+            self._streak = 1
+        if self._streak >= self.stable_frames and counts != self.published:
+            self.published = counts
+            return counts
+        return None
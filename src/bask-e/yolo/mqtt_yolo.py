@@ -1,15 +1,21 @@
 import cv2
 import numpy as np
 import json
-from elements.yolo import OBJ_DETECTION
+import time
 import paho.mqtt.client as mqtt
 from collections import Counter
+from frame_gate import FrameGate, StableCounts
+from pipeline import DetectionPipeline
+from detector import MODEL_PATHS, Detector
 
 # ---------------- Configuration ----------------
 
 # UI Display Control
 SHOW_UI = False
 
+# Capture, inférence et publication dans des threads séparés (voir pipeline)
+PIPELINED = True
+
 # Classes et couleurs d'objets
 OBJECT_CLASSES = ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat', 'traffic light',
                   'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
@@ -24,13 +30,30 @@ OBJECT_CLASSES = ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', '
 OBJECT_COLORS = np.random.randint(0, 255, size=(len(OBJECT_CLASSES), 3), dtype="uint8")
 
 # YOLO Object Detector
-OBJECT_DETECTOR = OBJ_DETECTION('/opt/bask-e/yolo/weights/yolov5s.pt', OBJECT_CLASSES)
+# Profil de détection (voir detector.PROFILES) : zone du panier, taille
+# d'entrée 320/416/640, tuiles. Comparer les profils avec bench_profiles.py.
+DETECTION_PROFILE = "full-320"
+# Seules ces classes sont gardées, dès la sortie du réseau (avant NMS)
+LABELS_OF_INTEREST = ['bottle', 'toothbrush', 'banana']
+# Seuils (confiance, IoU) propres à certaines classes, sinon 0.25 / 0.45
+CLASS_THRESHOLDS = {}
+# Moteur d'inférence (voir detector.BACKENDS) : "torch" (fp32), "onnx" ou
+# "onnx-int8" (modèles produits et validés par export_onnx.py)
+DETECTOR_BACKEND = "torch"
+# Construit au premier usage (voir get_detector) : le chargement du modèle
+# n'a pas lieu à l'import, et replay.py peut y substituer un autre détecteur.
+OBJECT_DETECTOR = None
 
 # MQTT Configuration
 MQTT_BROKER = "mqtt.eclipseprojects.io"  # Nouveau broker MQTT
 MQTT_PORT = 1883
 MQTT_TOPIC_READ = "camera/objects/detected"
 
+# Filtrage des images : inférence seulement si la scène bouge, publication
+# seulement si le comptage change (voir frame_gate)
+STABLE_FRAMES = 3  # inférences identiques avant publication d'un comptage
+GATE_STATS_INTERVAL = 60  # secondes entre deux relevés du filtre et des étages
+
 # ---------------- Initialisation ----------------
 
 def initialize_mqtt():
@@ -59,6 +82,15 @@ def gstreamer_pipeline(capture_width=1920, capture_height=1080, display_width=96
 
 # ---------------- Fonctions Principales ----------------
 
+def get_detector():
+    """Retourne le détecteur YOLO, chargé au premier appel."""
+    global OBJECT_DETECTOR
+    if OBJECT_DETECTOR is None:
+        OBJECT_DETECTOR = Detector(MODEL_PATHS[DETECTOR_BACKEND], OBJECT_CLASSES, DETECTION_PROFILE,
+                                   allowed=LABELS_OF_INTEREST, class_thresholds=CLASS_THRESHOLDS,
+                                   backend=DETECTOR_BACKEND)
+    return OBJECT_DETECTOR
+
 def draw_detections(frame, detections):
     """Dessine les détections d'objets sur le frame."""
     for obj in detections:
@@ -72,26 +104,63 @@ def draw_detections(frame, detections):
                     cv2.FONT_HERSHEY_SIMPLEX, 0.75, color, 1, cv2.LINE_AA)
     return frame
 
-def process_frame(frame, mqtt_client):
-    """Traite un frame vidéo : détecte les objets et publie sur MQTT."""
-    detections = OBJECT_DETECTOR.detect(frame)
+def detect_counts(frame, stable_counts):
+    """Détecte les objets ; retourne (détections, payload MQTT si le comptage a changé, sinon None)."""
+    detections = get_detector().detect(frame)
     
-    labels_of_interest = ['bottle', 'toothbrush', 'banana']
-
-    filtered_labels = [detection['label'] for detection in detections if detection['label'] in labels_of_interest]
-
-    label_counts = Counter(filtered_labels)
+    # Le détecteur ne renvoie que les LABELS_OF_INTEREST
+    label_counts = stable_counts.update(Counter(detection['label'] for detection in detections))
+    if label_counts is None:
+        return detections, None
 
     detections_str = [{"label" : l, "count" : c} for l, c in label_counts.items()]
-    
-    mqtt_payload = json.dumps(detections_str)
+    return detections, json.dumps(detections_str)
+
+def publish_counts(mqtt_client, mqtt_payload):
     mqtt_client.publish(MQTT_TOPIC_READ, mqtt_payload)
+    print(f"Publié sur MQTT : {mqtt_payload}")
+
+def process_frame(frame, mqtt_client, stable_counts):
+    """Traite un frame vidéo : détecte les objets et publie sur MQTT si le comptage a changé."""
+    detections, mqtt_payload = detect_counts(frame, stable_counts)
+    if mqtt_payload is not None:
+        publish_counts(mqtt_client, mqtt_payload)
     return detections
 
+def run_pipelined(cap, mqtt_client, gate, stable_counts):
+    """Mode pipeline : l'inférence prend toujours l'image la plus récente."""
+    latest = {'detections': []}
+
+    def infer(frame):
+        latest['detections'], mqtt_payload = detect_counts(frame, stable_counts)
+        return mqtt_payload
+
+    pipeline = DetectionPipeline(cap, infer, lambda mqtt_payload: publish_counts(mqtt_client, mqtt_payload), gate)
+    pipeline.start()
+    last_stats = time.monotonic()
+    try:
+        while not pipeline.wait(0.03 if SHOW_UI else 1.0):
+            if time.monotonic() - last_stats >= GATE_STATS_INTERVAL:
+                print(f"Filtre d'images : {gate.stats()}, étages : {pipeline.stats()}")
+                last_stats = time.monotonic()
+
+            if SHOW_UI:
+                frame = pipeline.slot.peek()
+                if frame is not None:
+                    cv2.imshow("CSI Camera", draw_detections(frame.copy(), latest['detections']))
+
+                # Quitter avec la touche 'q'
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    finally:
+        pipeline.stop()
+        print(f"Étages du pipeline : {pipeline.stats()}")
+
 # ---------------- Boucle Principale ----------------
 
 def main():
     """Boucle principale : acquisition vidéo, traitement et affichage."""
+    get_detector()  # Chargement du modèle avant la première image
     mqtt_client = initialize_mqtt()
     cap = cv2.VideoCapture(gstreamer_pipeline(flip_method=0), cv2.CAP_GSTREAMER)
 
@@ -102,15 +171,29 @@ def main():
     if SHOW_UI:
         cv2.namedWindow("CSI Camera", cv2.WINDOW_AUTOSIZE)
 
+    gate = FrameGate(settle_frames=STABLE_FRAMES)
+    stable_counts = StableCounts(STABLE_FRAMES)
+    detections = []
+    last_stats = time.monotonic()
+
     try:
+        if PIPELINED:
+            run_pipelined(cap, mqtt_client, gate, stable_counts)
+            return
+
         while True:
             ret, frame = cap.read()
             if not ret:
                 print("Erreur de lecture vidéo.")
                 break
 
-            # Détection et traitement
-            detections = process_frame(frame, mqtt_client)
+            # Détection et traitement, seulement si la scène a changé
+            if gate.should_infer(frame):
+                detections = process_frame(frame, mqtt_client, stable_counts)
+
+            if time.monotonic() - last_stats >= GATE_STATS_INTERVAL:
+                print(f"Filtre d'images : {gate.stats()}")
+                last_stats = time.monotonic()
             
             if SHOW_UI:
                 frame = draw_detections(frame, detections)
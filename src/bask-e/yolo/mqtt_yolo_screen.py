@@ -1,10 +1,16 @@
-import cv2
 import numpy as np
 import json
 import time
-from elements.yolo import OBJ_DETECTION
+import os
+import sys
 import paho.mqtt.client as mqtt
-from collections import Counter
+from camera import CameraManager
+from count_state import CountState
+from detector import MODEL_PATHS, Detector, vote_counts
+
+# Modules partagés du dossier parent (bask-e)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weight_codec import decode_weight_event
 
 FIRST_RECONNECT_DELAY = 1
 RECONNECT_RATE = 2
@@ -27,13 +33,34 @@ OBJECT_CLASSES = ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', '
 OBJECT_COLORS = np.random.randint(0, 255, size=(len(OBJECT_CLASSES), 3), dtype="uint8")
 
 # YOLO Object Detector
-OBJECT_DETECTOR = OBJ_DETECTION('/opt/bask-e/yolo/weights/yolov5s.pt', OBJECT_CLASSES)
+# Profil de détection (voir detector.PROFILES) : zone du panier, taille
+# d'entrée 320/416/640, tuiles. Comparer les profils avec bench_profiles.py.
+DETECTION_PROFILE = "full-320"
+# Seules ces classes sont gardées, dès la sortie du réseau (avant NMS)
+LABELS_OF_INTEREST = ['bottle', 'toothbrush', 'banana', 'apple']
+# Seuils (confiance, IoU) propres à certaines classes, sinon 0.25 / 0.45
+CLASS_THRESHOLDS = {}
+# Moteur d'inférence (voir detector.BACKENDS) : "torch" (fp32), "onnx" ou
+# "onnx-int8" (modèles produits et validés par export_onnx.py)
+DETECTOR_BACKEND = "torch"
+# Construit au premier usage (voir get_detector) : le chargement du modèle
+# n'a pas lieu à l'import, et replay.py peut y substituer un autre détecteur.
+OBJECT_DETECTOR = None
+
+# Nombre d'images successives analysées en un lot à chaque changement de poids,
+# puis fusionnées par vote (voir detector.vote_counts)
+SNAPSHOT_FRAMES = 3
 
 # MQTT Configuration
 MQTT_BROKER = "mqtt.eclipseprojects.io"  # Nouveau broker MQTT
 MQTT_PORT = 1883
 MQTT_TOPIC_READ = "camera/objects/detected"
-MQTT_TOPIC_WEIGHT = "scale/weight"
+MQTT_TOPIC_WEIGHT = "scale/weight/bin"  # JSON ou binaire, détecté à la réception
+
+# Persistance des comptages : instantané écrit en arrière-plan (voir count_state)
+RESULTS_FILE = "detection_results.json"
+RESULTS_SNAPSHOT_INTERVAL = 5  # secondes min entre deux écritures
+RESULTS_JOURNAL = None  # ex. "detection_journal.jsonl" pour garder l'historique des comptages
 
 # ---------------- Initialisation ----------------
 
@@ -82,63 +109,41 @@ def gstreamer_pipeline(capture_width=1920, capture_height=1080, display_width=96
         % (capture_width, capture_height, framerate, flip_method, display_width, display_height)
     )
 
+# Caméra ouverte une seule fois et gardée chaude (voir camera.CameraManager)
+CAMERA = CameraManager(gstreamer_pipeline())
+
 # ---------------- Fonctions Principales ----------------
 
-previous_label_counts = Counter()
-results_file = "detection_results.json"
+def get_detector():
+    """Retourne le détecteur YOLO, chargé au premier appel."""
+    global OBJECT_DETECTOR
+    if OBJECT_DETECTOR is None:
+        OBJECT_DETECTOR = Detector(MODEL_PATHS[DETECTOR_BACKEND], OBJECT_CLASSES, DETECTION_PROFILE,
+                                   allowed=LABELS_OF_INTEREST, class_thresholds=CLASS_THRESHOLDS,
+                                   backend=DETECTOR_BACKEND)
+    return OBJECT_DETECTOR
+
+# Comptages publiés en dernier, gardés en mémoire
+COUNT_STATE = CountState(RESULTS_FILE, RESULTS_SNAPSHOT_INTERVAL, RESULTS_JOURNAL)
 previous_weight = 0
 weight_threshold = 5  # Seuil de changement de poids en grammes
 
-def load_previous_results():
-    """Charge les résultats précédents depuis un fichier JSON."""
-    global previous_label_counts
-    try:
-        with open(results_file, "r") as f:
-            previous_label_counts = Counter(json.load(f))
-            print("Résultats précédents chargés depuis le fichier.")
-    except FileNotFoundError:
-        print("Fichier de résultats précédents non trouvé. Initialisation vide.")
-        previous_label_counts = Counter()
-    except json.JSONDecodeError as e:
-        print(f"Erreur de lecture du fichier JSON : {e}. Réinitialisation des résultats.")
-        previous_label_counts = Counter()
-
-def save_current_results(label_counts):
-    """Sauvegarde les résultats actuels dans un fichier JSON."""
-    try:
-        with open(results_file, "w") as f:
-            json.dump(label_counts, f)
-            print("Résultats actuels sauvegardés dans le fichier.")
-    except Exception as e:
-        print(f"Erreur lors de la sauvegarde des résultats : {e}")
-
-def capture_screen_and_process(mqtt_client):
-    """Capture une image de la caméra avec GStreamer, détecte les objets, et publie via MQTT."""
-    global previous_label_counts
-
-    cap = cv2.VideoCapture(gstreamer_pipeline(), cv2.CAP_GSTREAMER)
-
-    if not cap.isOpened():
-        print("Impossible d'ouvrir la caméra.")
-        return
-
-    ret, frame = cap.read()
-    cap.release()
-
-    if not ret:
-        print("Erreur lors de la capture de l'image.")
+def capture_screen_and_process(mqtt_client, after=None):
+    """Prend SNAPSHOT_FRAMES images (capturées après `after`), détecte les objets, et publie via MQTT."""
+    frames = CAMERA.get_frames(SNAPSHOT_FRAMES, after)
+    if frames is None:
+        print(f"Erreur lors de la capture de l'image, caméra : {CAMERA.stats()}")
         return
 
-    # Détection d'objets
-    detections = OBJECT_DETECTOR.detect(frame)
+    # Détection d'objets, en un seul lot
+    frames_detections = get_detector().detect_batch(frames)
 
-    # Filtrer et compter les labels d'intérêt
-    labels_of_interest = ['bottle', 'toothbrush', 'banana', 'apple']
-    filtered_labels = [detection['label'] for detection in detections if detection['label'] in labels_of_interest]
-    label_counts = Counter(filtered_labels)
+    # Compter les labels d'intérêt par vote sur les images du lot
+    label_counts = vote_counts(frames_detections, LABELS_OF_INTEREST)
 
     # Calculer la différence avec le comptage précédent
-    label_diff = {label: label_counts[label] - previous_label_counts[label] for label in labels_of_interest}
+    previous_label_counts = COUNT_STATE.get()
+    label_diff = {label: label_counts[label] - previous_label_counts[label] for label in LABELS_OF_INTEREST}
 
     # Préparer la charge utile JSON
     detections_str = [
@@ -151,18 +156,16 @@ def capture_screen_and_process(mqtt_client):
     mqtt_client.publish(MQTT_TOPIC_READ, mqtt_payload)
     print(f"Publié sur MQTT : {mqtt_payload}")
 
-    # Sauvegarder les comptages actuels
-    save_current_results(label_counts)
-
-    # Mettre à jour les comptages précédents
-    previous_label_counts = label_counts
+    # Mettre à jour les comptages précédents (sauvegardés en arrière-plan)
+    COUNT_STATE.update(label_counts)
 
 def on_weight_change(client, userdata, message):
     """Callback exécuté lorsqu'un changement de poids est détecté."""
     global previous_weight
 
+    received = time.monotonic()
     try:
-        payload = json.loads(message.payload.decode("utf-8"))
+        payload = decode_weight_event(message.payload)
         current_weight = payload.get("weight", 0)
 
         # Vérifier le changement de poids
@@ -171,14 +174,17 @@ def on_weight_change(client, userdata, message):
             previous_weight = current_weight
 
             # Déclencher le script YOLO
-            capture_screen_and_process(client)
+            capture_screen_and_process(client, after=received)
     except Exception as e:
         print(f"Erreur dans le traitement du message MQTT : {e}")
 
 # ---------------- Exécution ----------------
 
 if __name__ == "__main__":
-    load_previous_results()
+    COUNT_STATE.load()
+    COUNT_STATE.start()
+    get_detector()  # Chargement du modèle avant le premier changement de poids
+    CAMERA.start()
     mqtt_client = initialize_mqtt()
 
     # S'abonner au sujet de la balance
@@ -191,4 +197,7 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("Arrêt par l'utilisateur.")
     finally:
+        CAMERA.stop()
+        COUNT_STATE.stop()
+        print(f"Comptages : {COUNT_STATE.stats()}")
         print("Programme terminé proprement.")
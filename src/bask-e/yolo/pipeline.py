@@ -0,0 +1,242 @@
+import queue
+import threading
+import time
+from collections import deque
+
+# ---------------- Configuration par défaut ----------------
+
+PUBLISH_QUEUE_SIZE = 8  # Résultats en attente de publication
+TIMER_SAMPLES = 1000  # Dernières mesures gardées pour les percentiles
+
+
+class LatestFrameSlot:
+    """Emplacement unique contenant la dernière image capturée.
+
+    La capture écrase l'image précédente si elle n'a pas encore été prise :
+    le consommateur reçoit toujours l'image la plus récente, jamais une image
+    en file depuis plusieurs centaines de ms.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._stamp = None
+        self._seq = 0
+        self._closed = False
+
+        # Compteurs
+        self.overwritten = 0
+
+    def put(self, frame, stamp=None):
+        with self._cond:
+            if self._frame is not None:
+                self.overwritten += 1
+            self._frame = frame
+            self._stamp = time.monotonic() if stamp is None else stamp
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Prend la dernière image ; retourne (frame, instant de capture) ou None si fermé/expiré."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame is not None or self._closed, timeout):
+                return None
+            if self._frame is None:
+                return None
+            frame, stamp = self._frame, self._stamp
+            self._frame = None
+            return frame, stamp
+
+    def peek(self):
+        """Dernière image sans la consommer (affichage)."""
+        with self._cond:
+            return self._frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageTimer:
+    """Durées d'un étage du pipeline : cumuls et percentiles sur les dernières mesures."""
+
+    def __init__(self, samples=TIMER_SAMPLES):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=samples)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """Percentile `q` (0-100) des dernières mesures, en ms."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))] * 1000
+
+    def snapshot(self):
+        with self._lock:
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            'count': count,
+            'avg_ms': total / count * 1000 if count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': maximum * 1000
+        }
+
+
+class DetectionPipeline:
+    """Capture, inférence et publication dans trois threads découplés.
+
+    - capture : lit la caméra en continu et écrase LatestFrameSlot ;
+    - inférence : prend l'image la plus récente, la soumet au filtre
+      `gate` éventuel puis à `infer(frame)`, qui retourne un message à
+      publier ou None ;
+    - publication : envoie les messages via `publish(message)`.
+
+    Une inférence lente ne bloque donc plus la capture, et l'appsink
+    GStreamer est vidé en continu au lieu d'accumuler des images périmées.
+    Une exception dans un étage arrête tout le pipeline (wait() retourne),
+    comme une erreur de lecture caméra : le service peut redémarrer.
+    """
+
+    def __init__(self, cap, infer, publish, gate=None, publish_queue_size=PUBLISH_QUEUE_SIZE):
+        self.cap = cap
+        self.infer = infer
+        self.publish = publish
+        self.gate = gate
+        self.slot = LatestFrameSlot()
+        self._outbox = queue.Queue(publish_queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.timers = {name: StageTimer() for name in ('capture', 'inference', 'publish', 'end_to_end')}
+        self.publish_dropped = 0
+        self.error = None
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def start(self):
+        for name, target in (('capture', self._capture), ('inference', self._inference), ('publish', self._publish)):
+            thread = threading.Thread(target=self._guard, args=(name, target), name=f"yolo-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self.slot.close()
+        if not self._threads:
+            return
+        # Capture et inférence d'abord : le résultat de la dernière image est
+        # mis en file avant que la publication ne reçoive sa fin (None).
+        capture, inference, publish = self._threads
+        capture.join()
+        inference.join()
+        # La publication a pu s'arrêter sur une erreur : ne pas attendre une file pleine.
+        while publish.is_alive():
+            try:
+                self._outbox.put(None, timeout=0.5)
+                break
+            except queue.Full:
+                pass
+        publish.join()
+        self._threads = []
+
+    def wait(self, timeout=None):
+        """Attend l'arrêt du pipeline (erreur caméra ou d'un étage) ; retourne True s'il est arrêté."""
+        return self._stop.wait(timeout)
+
+    def _guard(self, name, target):
+        try:
+            target()
+        except Exception as e:
+            print(f"Erreur dans l'étage {name} du pipeline : {e!r}")
+            self.error = e
+            self._stop.set()
+            self.slot.close()
+
+    def _capture(self):
+        timer = self.timers['capture']
+        while not self._stop.is_set():
+            start = time.monotonic()
+            ret, frame = self.cap.read()
+            if not ret:
+                print("Erreur de lecture vidéo.")
+                self._stop.set()
+                self.slot.close()
+                return
+            now = time.monotonic()
+            timer.observe(now - start)
+            self.slot.put(frame, now)
+
+    def _inference(self):
+        timer = self.timers['inference']
+        while True:
+            # Après l'arrêt, la dernière image capturée est encore traitée.
+            latest = self.slot.get(timeout=1.0)
+            if latest is None:
+                if self._stop.is_set():
+                    return
+                continue
+            frame, stamp = latest
+            if self.gate is not None and not self.gate.should_infer(frame):
+                continue
+            start = time.monotonic()
+            message = self.infer(frame)
+            timer.observe(time.monotonic() - start)
+            if message is None:
+                continue
+            self._enqueue(message, stamp)
+
+    def _enqueue(self, message, stamp):
+        """Met un message en file ; si elle est pleine, le plus ancien est remplacé.
+
+        Un message n'est produit qu'au changement du comptage (voir
+        StableCounts) : écarter le plus récent le perdrait pour de bon,
+        alors que chaque message remplace ceux qui le précèdent.
+        """
+        while True:
+            try:
+                self._outbox.put_nowait((message, stamp))
+                return
+            except queue.Full:
+                # Publication bloquée (broker injoignable)
+                try:
+                    self._outbox.get_nowait()
+                    self.publish_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _publish(self):
+        timer = self.timers['publish']
+        end_to_end = self.timers['end_to_end']
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                return
+            message, stamp = item
+            start = time.monotonic()
+            self.publish(message)
+            now = time.monotonic()
+            timer.observe(now - start)
+            end_to_end.observe(now - stamp)
+
+    def stats(self):
+        """Durées par étage, images écrasées avant inférence et anciens messages remplacés."""
+        stats = {name: timer.snapshot() for name, timer in self.timers.items()}
+        stats['frames_overwritten'] = self.slot.overwritten
+        stats['publish_dropped'] = self.publish_dropped
+        return stats
@@ -0,0 +1,227 @@
+import argparse
+import os
+import time
+from types import SimpleNamespace
+import cv2
+import mqtt_yolo
+import mqtt_yolo_screen
+from camera import CameraManager
+from frame_gate import FrameGate, StableCounts
+from pipeline import DetectionPipeline, StageTimer
+
+# Rejoue des images enregistrées dans les services caméra, sans caméra CSI
+# ni GPU : source d'images, détecteur et broker MQTT sont remplaçables.
+
+# --------------------- Configuration ---------------------
+
+FPS = 10  # Cadence de la caméra simulée (0 : aussi vite que possible)
+STUB_LATENCY = 0.0  # Durée (s) simulée d'une inférence du détecteur factice
+SNAPSHOT_EVENTS = 20  # Changements de poids simulés en mode snapshot
+SNAPSHOT_INTERVAL = 0.5  # secondes entre deux changements de poids
+
+# --------------------- Sources d'images ---------------------
+
+class FrameSource:
+    """Source enregistrée au format de cv2.VideoCapture (isOpened, read, release), cadencée à `fps`."""
+
+    def __init__(self, fps=FPS):
+        self.period = 1.0 / fps if fps else 0.0
+        self._next = None
+
+    def _pace(self):
+        if not self.period:
+            return
+        now = time.monotonic()
+        if self._next is None:
+            self._next = now
+        elif self._next > now:
+            time.sleep(self._next - now)
+        self._next += self.period
+
+    def release(self):
+        pass
+
+
+class ImageDirectorySource(FrameSource):
+    """Images d'un dossier, dans l'ordre des noms."""
+
+    def __init__(self, directory, fps=FPS):
+        super().__init__(fps)
+        self.paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                      if name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
+        self._index = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        if self._index >= len(self.paths):
+            return False, None
+        self._pace()
+        frame = cv2.imread(self.paths[self._index])
+        self._index += 1
+        return frame is not None, frame
+
+
+class VideoFileSource(FrameSource):
+    """Vidéo enregistrée (tout format lisible par OpenCV)."""
+
+    def __init__(self, path, fps=FPS):
+        super().__init__(fps)
+        self.cap = cv2.VideoCapture(path)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        self._pace()
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+def open_source(path, fps=FPS):
+    """Ouvre un dossier d'images ou une vidéo enregistrée."""
+    if os.path.isdir(path):
+        return ImageDirectorySource(path, fps)
+    return VideoFileSource(path, fps)
+
+# --------------------- Remplaçants ---------------------
+
+class StubDetector:
+    """Détecteur factice, rapide et déterministe.
+
+    Le nombre d'objets dépend de la luminosité moyenne de l'image : le
+    comptage varie avec la scène enregistrée, ce qui exerce le filtre
+    d'images et la publication sur changement.
+    """
+
+    def __init__(self, labels, latency=STUB_LATENCY):
+        self.labels = labels
+        self.latency = latency
+
+    def detect(self, frame):
+        if self.latency:
+            time.sleep(self.latency)
+        height, width = frame.shape[:2]
+        count = int(frame[::32, ::32].mean()) // 64
+        return [{'label': self.labels[i % len(self.labels)], 'bbox': [(0, 0), (width // 4, height // 4)], 'score': 0.9}
+                for i in range(count)]
+
+    def detect_batch(self, frames):
+        return [self.detect(frame) for frame in frames]
+
+
+class LocalMQTT:
+    """Remplaçant local du client paho : garde les messages publiés et les remet aux abonnés."""
+
+    def __init__(self):
+        self.messages = []  # (instant, topic, payload)
+        self._callbacks = {}
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.messages.append((time.monotonic(), topic, payload))
+        if isinstance(payload, str):
+            payload = payload.encode()
+        message = SimpleNamespace(topic=topic, payload=payload, qos=qos, retain=retain)
+        for callback in self._callbacks.get(topic, ()):
+            callback(self, None, message)
+
+    def subscribe(self, topic, qos=0):
+        pass
+
+    def message_callback_add(self, topic, callback):
+        self._callbacks.setdefault(topic, []).append(callback)
+
+# --------------------- Modes ---------------------
+
+def replay_stream(args, client):
+    """Flux continu de mqtt_yolo : filtre d'images, pipeline à trois threads, publication sur changement."""
+    source = open_source(args.source, args.fps)
+    gate = None if args.no_gate else FrameGate(settle_frames=mqtt_yolo.STABLE_FRAMES)
+    stable_counts = StableCounts(mqtt_yolo.STABLE_FRAMES)
+    pipeline = DetectionPipeline(
+        source,
+        lambda frame: mqtt_yolo.detect_counts(frame, stable_counts)[1],
+        lambda mqtt_payload: mqtt_yolo.publish_counts(client, mqtt_payload),
+        gate)
+
+    start = time.monotonic()
+    pipeline.start()
+    pipeline.wait()
+    pipeline.stop()
+    elapsed = time.monotonic() - start
+
+    source.release()
+    if gate is not None:
+        print(f"Filtre d'images : {gate.stats()}")
+    return elapsed, pipeline.timers, {'frames_overwritten': pipeline.slot.overwritten}
+
+
+def replay_snapshot(args, client):
+    """Mode mqtt_yolo_screen : lot d'images et vote à chaque changement de poids simulé."""
+    # La vidéo est rejouée en boucle : la caméra rouvre la source en fin d'enregistrement.
+    camera = CameraManager(None, warmup_frames=0, opener=lambda: open_source(args.source, args.fps))
+    mqtt_yolo_screen.CAMERA = camera
+    camera.start()
+
+    timer = StageTimer()
+    start = time.monotonic()
+    try:
+        for _ in range(args.events):
+            event = time.monotonic()
+            mqtt_yolo_screen.capture_screen_and_process(client, after=event)
+            timer.observe(time.monotonic() - event)
+            time.sleep(args.interval)
+    finally:
+        camera.stop()
+    elapsed = time.monotonic() - start
+    return elapsed, {'weight_to_publish': timer}, {'camera': camera.stats()}
+
+# --------------------- Rapport ---------------------
+
+def report(elapsed, timers, published, extra):
+    print(f"{'étage':<18} {'n':>6} {'moy.':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, timer in timers.items():
+        stats = timer.snapshot()
+        if not stats['count']:
+            continue
+        print(f"{name:<18} {stats['count']:>6} {stats['avg_ms']:>8.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+
+    print(f"Durée : {elapsed:.1f} s")
+    if 'capture' in timers:
+        print(f"Images capturées : {timers['capture'].count / elapsed:.1f} /s, "
+              f"inférées : {timers['inference'].count / elapsed:.1f} /s")
+    print(f"Messages publiés : {published} ({published / elapsed:.2f} /s)")
+    for key, value in extra.items():
+        print(f"{key} : {value}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejoue des images enregistrées dans les services caméra.")
+    parser.add_argument("source", help="vidéo ou dossier d'images enregistrées")
+    parser.add_argument("--mode", choices=("stream", "snapshot"), default="stream",
+                        help="stream : mqtt_yolo ; snapshot : mqtt_yolo_screen")
+    parser.add_argument("--detector", choices=("stub", "yolo"), default="stub")
+    parser.add_argument("--stub-latency", type=float, default=STUB_LATENCY,
+                        help="durée (s) simulée d'une inférence du détecteur factice")
+    parser.add_argument("--fps", type=float, default=FPS, help="cadence de lecture (0 : sans limite)")
+    parser.add_argument("--no-gate", action="store_true", help="infère toutes les images (mode stream)")
+    parser.add_argument("--events", type=int, default=SNAPSHOT_EVENTS)
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_INTERVAL)
+    args = parser.parse_args()
+
+    service = mqtt_yolo if args.mode == "stream" else mqtt_yolo_screen
+    if args.detector == "stub":
+        service.OBJECT_DETECTOR = StubDetector(service.LABELS_OF_INTEREST, args.stub_latency)
+    else:
+        service.get_detector()  # Chargement du modèle hors des mesures
+
+    client = LocalMQTT()
+    replay = replay_stream if args.mode == "stream" else replay_snapshot
+    elapsed, timers, extra = replay(args, client)
+    report(elapsed, timers, len(client.messages), extra)
+
+if __name__ == '__main__':
+    main()